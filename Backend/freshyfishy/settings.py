@@ -55,6 +55,7 @@ INSTALLED_APPS = [
     "project",
     'corsheaders',
     'rest_framework',
+    'django_apscheduler',
 ]
 
 MIDDLEWARE = [
@@ -106,6 +107,127 @@ DATABASES = {
     }
 }
 
+# MQTT sensor ingest buffering (see project/ingest.py)
+
+SENSOR_BUFFER_SIZE = int(os.environ.get('SENSOR_BUFFER_SIZE', 1000))
+SENSOR_BATCH_SIZE = int(os.environ.get('SENSOR_BATCH_SIZE', 100))
+SENSOR_FLUSH_INTERVAL = float(os.environ.get('SENSOR_FLUSH_INTERVAL', 2.0))
+SENSOR_BUFFER_PUT_TIMEOUT = float(os.environ.get('SENSOR_BUFFER_PUT_TIMEOUT', 0.5))
+SENSOR_FLUSH_RETRIES = int(os.environ.get('SENSOR_FLUSH_RETRIES', 3))
+SENSOR_FLUSH_RETRY_BACKOFF = float(os.environ.get('SENSOR_FLUSH_RETRY_BACKOFF', 0.5))
+# Largest batch accepted in one sensor message (see project/payloads.py)
+SENSOR_PAYLOAD_MAX_READINGS = int(os.environ.get('SENSOR_PAYLOAD_MAX_READINGS', 255))
+
+# Device command round-trips (see project/device_commands.py)
+
+DEVICE_COMMAND_TIMEOUT = float(os.environ.get('DEVICE_COMMAND_TIMEOUT', 30))
+DEVICE_MAX_IN_FLIGHT = int(os.environ.get('DEVICE_MAX_IN_FLIGHT', 2))
+
+# Status requests and device changes within this many seconds share one
+# Freshyfishy/status publish
+DEVICE_STATUS_DEBOUNCE = float(os.environ.get('DEVICE_STATUS_DEBOUNCE', 0.25))
+
+# MQTT handlers that touch the database run on TOPIC_WORKERS lanes (one
+# device always uses the same lane). The ingest process refreshes its stats
+# in the cache every INGEST_STATS_INTERVAL seconds for /ingestStats/.
+
+TOPIC_WORKERS = int(os.environ.get('TOPIC_WORKERS', 4))
+TOPIC_QUEUE_SIZE = int(os.environ.get('TOPIC_QUEUE_SIZE', 1000))
+INGEST_STATS_INTERVAL = float(os.environ.get('INGEST_STATS_INTERVAL', 5))
+
+# /report/ streaming and /report/summary/ limits
+
+REPORT_CHUNK_SIZE = int(os.environ.get('REPORT_CHUNK_SIZE', 2000))
+REPORT_MAX_BUCKETS = int(os.environ.get('REPORT_MAX_BUCKETS', 3000))
+
+# Readings further apart than this count as a gap in rollup eval minutes
+
+ROLLUP_MAX_GAP_MINUTES = float(os.environ.get('ROLLUP_MAX_GAP_MINUTES', 10))
+
+# History retention (see project/retention.py). Raw readings are compacted
+# into rollups and purged, hourly rollups are purged later, daily rollups kept.
+
+RAW_RETENTION_DAYS = int(os.environ.get('RAW_RETENTION_DAYS', 30))
+ROLLUP_HOURLY_RETENTION_DAYS = int(os.environ.get('ROLLUP_HOURLY_RETENTION_DAYS', 365))
+EVENT_RETENTION_DAYS = int(os.environ.get('EVENT_RETENTION_DAYS', 365))
+RETENTION_CHUNK_SIZE = int(os.environ.get('RETENTION_CHUNK_SIZE', 5000))
+RETENTION_ARCHIVE_DIR = os.environ.get('RETENTION_ARCHIVE_DIR', '')
+
+# Cache shared by web workers and the ingest process. Set REDIS_URL in
+# production, local memory is only shared within one process.
+
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a process trusts its compiled preference thresholds before
+# checking the shared cache for a newer version
+
+PREFS_LOCAL_TTL = float(os.environ.get('PREFS_LOCAL_TTL', 1.0))
+
+# Days of sensor history re-graded when the thresholds change
+
+PREFS_REGRADE_DAYS = int(os.environ.get('PREFS_REGRADE_DAYS', 7))
+
+# Server-Sent Events (/events/): seconds between keep-alive comments and
+# events buffered per client before a slow client starts missing them
+
+EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+
+# Feeding/light schedule runner (see project/schedule_runner.py). A run found
+# late by more than the grace window is skipped; upcoming runs are re-read
+# from the database every resync interval in case an event was lost
+
+SCHEDULE_MISFIRE_GRACE = int(os.environ.get('SCHEDULE_MISFIRE_GRACE', 300))
+SCHEDULE_REMINDER_MINUTES = int(os.environ.get('SCHEDULE_REMINDER_MINUTES', 3))
+SCHEDULE_RESYNC_INTERVAL = int(os.environ.get('SCHEDULE_RESYNC_INTERVAL', 3600))
+
+# Start the scheduler in every process (manage.py run_scheduler always does).
+# Replicas elect one leader through a lease renewed every third of its length
+
+SCHEDULER_AUTOSTART = os.environ.get('SCHEDULER_AUTOSTART', 'False') == 'True'
+SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', 30))
+
+# Push notifications are queued and sent by worker threads. FCM accepts up
+# to 500 tokens per multicast. Use project.notifications.LocMemBackend to
+# run without Firebase.
+
+NOTIFICATION_BACKEND = os.environ.get('NOTIFICATION_BACKEND', 'project.notifications.FirebaseBackend')
+NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', 2))
+NOTIFICATION_QUEUE_SIZE = int(os.environ.get('NOTIFICATION_QUEUE_SIZE', 100))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 500))
+NOTIFICATION_MAX_RETRIES = int(os.environ.get('NOTIFICATION_MAX_RETRIES', 3))
+NOTIFICATION_RETRY_BACKOFF = float(os.environ.get('NOTIFICATION_RETRY_BACKOFF', 1.0))
+
+# Water-quality alerts are pushed when a metric gets worse. A metric only
+# counts as recovered once it is clear of the threshold by its hysteresis
+# margin, and at most ALERT_RATE_LIMIT alerts go out per ALERT_RATE_WINDOW
+# seconds.
+
+ALERT_HYSTERESIS = {
+    'temp': float(os.environ.get('ALERT_HYSTERESIS_TEMP', 0.5)),
+    'ph': float(os.environ.get('ALERT_HYSTERESIS_PH', 0.1)),
+    'tds': float(os.environ.get('ALERT_HYSTERESIS_TDS', 10)),
+    'waterLv': float(os.environ.get('ALERT_HYSTERESIS_WATERLV', 2)),
+}
+ALERT_RATE_LIMIT = int(os.environ.get('ALERT_RATE_LIMIT', 6))
+ALERT_RATE_WINDOW = int(os.environ.get('ALERT_RATE_WINDOW', 3600))
+# Seconds an alert state lock is held at most (see project/alerts.py)
+ALERT_LOCK_TIMEOUT = float(os.environ.get('ALERT_LOCK_TIMEOUT', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
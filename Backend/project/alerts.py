@@ -0,0 +1,143 @@
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .devices import device_name
+from .evaluation import SEVERITY, get_rules
+from .models import DEFAULT_DEVICE
+from .notifications import sendPushNotification
+
+ALERT_BODIES = {
+    "Orange": "Water quality needs attention!",
+    "Red": "Critical water quality evaluate detected!",
+}
+
+def shrink(low_high, margin):
+    return (low_high[0] + margin, low_high[1] - margin)
+
+
+# Grade one metric. Getting worse happens at the threshold itself, getting
+# better only once the value is clear of it by the hysteresis margin, so a
+# reading hovering at a threshold doesn't flap between states.
+def settle(rules, value, green, orange, previous, margin):
+    state = rules.grade(value, green, orange)
+    if SEVERITY[state] >= SEVERITY[previous]:
+        return state
+    recovered = rules.grade(value, shrink(green, margin), shrink(orange, margin))
+    return min(recovered, previous, key=SEVERITY.get)
+
+
+def alert_state_key(device_id):
+    return f"alerts:{device_id}"
+
+
+# Ingest and web workers all update the state in the shared cache, so the
+# lock lives there too. cache.add only succeeds for one caller; the timeout
+# frees a lock whose holder died.
+@contextmanager
+def alert_lock(device_id):
+    key = f"{alert_state_key(device_id)}:lock"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.ALERT_LOCK_TIMEOUT
+    while not cache.add(key, token, timeout=settings.ALERT_LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Alert state of device {device_id} is locked")
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def load_alert_state(device_id):
+    return cache.get(alert_state_key(device_id)) or {"metrics": {}, "sent": [], "suppressed": 0}
+
+
+def save_alert_state(device_id, state):
+    cache.set(alert_state_key(device_id), state, timeout=None)
+
+
+def allow_notification(state, now):
+    # At most ALERT_RATE_LIMIT pushes per sliding ALERT_RATE_WINDOW
+    window_start = now - settings.ALERT_RATE_WINDOW
+    state["sent"] = [sent for sent in state["sent"] if sent > window_start]
+    if len(state["sent"]) >= settings.ALERT_RATE_LIMIT:
+        state["suppressed"] += 1
+        return False
+    state["sent"].append(now)
+    return True
+
+
+def alert_message(device_id, escalated, recovered):
+    title = "Water Quality Alert"
+    deviceId = device_name(device_id)
+    if deviceId != DEFAULT_DEVICE:
+        title = f"{title} ({deviceId})"
+
+    if escalated:
+        worst = max(escalated.values(), key=SEVERITY.get)
+        details = ", ".join(f"{name} {level}" for name, level in escalated.items())
+        return title, f"{ALERT_BODIES[worst]} ({details})", worst
+    if recovered:
+        return title, "Water quality is back to normal.", "Green"
+    return None
+
+
+# Feed one reading through the tank's per-metric alert states and push a
+# notification only when a metric gets worse, or when everything is back
+# to Green. Returns the notification sent (title, body, eval) or None.
+def evaluate_alerts(device_id, temp, ph, tds, waterLv):
+    rules = get_rules(device_id)
+    values = {"temp": temp, "ph": ph, "tds": tds, "waterLv": waterLv}
+
+    with alert_lock(device_id):
+        state = load_alert_state(device_id)
+        previous = state["metrics"]
+        current = {}
+        escalated = {}
+        escalated_fields = []
+        for name, field, green, orange in rules.metrics:
+            before = previous.get(field, "Green")
+            after = settle(
+                rules, values[field], green, orange, before,
+                settings.ALERT_HYSTERESIS[field],
+            )
+            current[field] = after
+            if SEVERITY[after] > SEVERITY[before]:
+                escalated[name] = after
+                escalated_fields.append(field)
+
+        recovered = any(level != "Green" for level in previous.values()) and all(
+            level == "Green" for level in current.values()
+        )
+
+        message = alert_message(device_id, escalated, recovered)
+        if message and not allow_notification(state, time.time()):
+            print(f"Alert rate limit reached, suppressed: {message[1]}")
+            message = None
+            # Not pushed, so not recorded either: the next reading still
+            # finds the change and pushes it once the rate limit allows
+            if escalated:
+                for field in escalated_fields:
+                    current[field] = previous.get(field, "Green")
+            else:
+                current = dict(previous)
+        state["metrics"] = current
+        save_alert_state(device_id, state)
+
+    if message:
+        sendPushNotification(*message)
+    return message
+
+
+# Ingest entry point, a failing alert must never cost the reading itself
+def check_alerts(device_id, temp, ph, tds, waterLv):
+    try:
+        return evaluate_alerts(device_id, temp, ph, tds, waterLv)
+    except Exception as e:
+        print(f"Error evaluating alerts: {str(e)}")
+        return None
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 import os
 
 class ProjectConfig(AppConfig):
@@ -6,18 +7,11 @@ class ProjectConfig(AppConfig):
     name = "project"
 
     def ready(self):
-        if os.environ.get('RUN_MAIN'):
-            from .scheduler import (
-                check_and_trigger_task,
-                check_and_trigger_notification,
-                check_and_noti_task,
-                everyday_task_reset
-            )  
-            from apscheduler.schedulers.background import BackgroundScheduler
+        from . import signals
 
-            scheduler = BackgroundScheduler()
-            scheduler.add_job(check_and_trigger_task, 'interval', minutes=1)
-            scheduler.add_job(check_and_trigger_notification, 'interval', minutes=15)
-            scheduler.add_job(check_and_noti_task, 'interval', minutes=1)
-            scheduler.add_job(everyday_task_reset, 'cron', hour='00', minute='00')
-            scheduler.start()
\ No newline at end of file
+        # Every replica may start the scheduler, a lease elects the one
+        # that actually runs jobs (see scheduler.start_scheduler)
+        if settings.SCHEDULER_AUTOSTART or os.environ.get('RUN_MAIN'):
+            from .scheduler import start_scheduler
+
+            start_scheduler()
@@ -0,0 +1,123 @@
+import asyncio
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Responses are echoed back by the firmware as "<message>#<request id>"
+RESPONSE_PATTERN = re.compile(r"^(?P<message>.*)#(?P<request_id>[0-9a-f]{8})$", re.DOTALL)
+
+
+class DeviceCommandError(Exception):
+    pass
+
+
+class DeviceBusy(DeviceCommandError):
+    pass
+
+
+class DeviceTimeout(DeviceCommandError):
+    pass
+
+
+class DeviceCommandRPC:
+    # Publishes a command with a correlation id and hands back a Future that
+    # is resolved by the matching message on the response topic. Each device
+    # gets a bounded number of in-flight commands so one slow ESP32 can't tie
+    # up every worker thread. command_topic maps a device to the topic it
+    # listens on; replies may come back on any of response_topics.
+    def __init__(self, mqtt_client, command_topic, response_topics,
+                 timeout=30, max_in_flight=2):
+        self.mqtt_client = mqtt_client
+        self.command_topic = command_topic
+        self.response_topics = response_topics
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+
+        self.pending = OrderedDict()
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def _slot(self, device):
+        with self.lock:
+            if device not in self.slots:
+                self.slots[device] = threading.BoundedSemaphore(self.max_in_flight)
+            return self.slots[device]
+
+    def send(self, command, device="default"):
+        slot = self._slot(device)
+        if not slot.acquire(blocking=False):
+            raise DeviceBusy(f"Too many pending commands for device '{device}'")
+
+        request_id = uuid.uuid4().hex[:8]
+        future = Future()
+        with self.lock:
+            self.pending[request_id] = (device, future)
+
+        def release(_):
+            with self.lock:
+                self.pending.pop(request_id, None)
+            slot.release()
+
+        future.add_done_callback(release)
+
+        try:
+            self.mqtt_client.connect()
+            for topic in self.response_topics:
+                self.mqtt_client.subscribe(topic)
+            if not self.mqtt_client.publish(self.command_topic(device), f"{command}#{request_id}"):
+                raise DeviceCommandError("not connected to the broker")
+        except Exception as e:
+            future.set_exception(DeviceCommandError(f"Publish failed: {str(e)}"))
+        return future
+
+    def call(self, command, device="default", timeout=None):
+        future = self.send(command, device)
+        try:
+            return future.result(timeout or self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise DeviceTimeout("Response timeout")
+
+    # Same as call() for async views: the reply is awaited, not waited on
+    # by a thread, so one worker can hold many pending commands
+    async def acall(self, command, device="default", timeout=None):
+        future = await asyncio.to_thread(self.send, command, device)
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise DeviceTimeout("Response timeout")
+
+    # A reply only ever completes a command sent to the device it came from
+    def resolve(self, payload, device="default"):
+        match = RESPONSE_PATTERN.match(payload)
+        with self.lock:
+            if match:
+                entry = self.pending.get(match.group("request_id"))
+                if entry and entry[0] != device:
+                    entry = None
+                message = match.group("message")
+            else:
+                # Firmware without correlation support: the device's oldest
+                # request wins
+                entry = next(
+                    (entry for entry in self.pending.values() if entry[0] == device), None
+                )
+                message = payload
+
+        if entry is None:
+            # Not ours, another worker sent this command
+            return False
+
+        _, future = entry
+        try:
+            future.set_result(message)
+        except InvalidStateError:
+            # Timed out and cancelled before the device answered
+            return False
+        return True
@@ -0,0 +1,92 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import feedingData, lightData
+
+
+# Feed and light are cached separately so a feed written by one process and
+# a light change written by another never overwrite each other
+def feed_key(device_id):
+    return f"device:{device_id}:feed"
+
+
+def light_key(device_id):
+    return f"device:{device_id}:light"
+
+
+def latest_feed(device_id):
+    return feedingData.objects.filter(device_id=device_id).latest("recorded_at").timestamp.timestamp()
+
+
+def latest_light(device_id):
+    light = lightData.objects.filter(device_id=device_id).latest("recorded_at")
+    return {"light": light.status, "color": light.color}
+
+
+# The {feed, light, color} payload of a tank's Freshyfishy/status, read
+# afresh for every (debounced) publish so rows written by any process show
+# up. With REDIS_URL the write-through cache is shared and answers it, only
+# a miss reaches the database; without it the cache is private to each
+# process and would go stale, so the two latest rows are read instead.
+def get_device_state(device_id):
+    if not settings.REDIS_URL:
+        return {"feed": latest_feed(device_id), **latest_light(device_id)}
+
+    parts = cache.get_many([feed_key(device_id), light_key(device_id)])
+    if feed_key(device_id) not in parts:
+        parts[feed_key(device_id)] = latest_feed(device_id)
+        cache.set(feed_key(device_id), parts[feed_key(device_id)], timeout=None)
+    if light_key(device_id) not in parts:
+        parts[light_key(device_id)] = latest_light(device_id)
+        cache.set(light_key(device_id), parts[light_key(device_id)], timeout=None)
+    return {"feed": parts[feed_key(device_id)], **parts[light_key(device_id)]}
+
+
+# Write-through, called for every stored feed or light row
+def record_feed(feed):
+    cache.set(feed_key(feed.device_id), feed.timestamp.timestamp(), timeout=None)
+
+
+def record_light(light):
+    cache.set(light_key(light.device_id), {"light": light.status, "color": light.color}, timeout=None)
+
+
+class DebouncedCall:
+    # Coalesces a burst of requests for the same key into one call at the
+    # end of the window
+    def __init__(self, callback, window=0.25):
+        self.callback = callback
+        self.window = window
+        self.requested = 0
+        self.calls = 0
+
+        self._lock = threading.Lock()
+        self._timers = {}
+
+    def request(self, key):
+        with self._lock:
+            self.requested += 1
+            if key in self._timers:
+                return
+            timer = threading.Timer(self.window, self._fire, args=[key])
+            timer.daemon = True
+            self._timers[key] = timer
+            timer.start()
+
+    def stats(self):
+        return {"requested": self.requested, "calls": self.calls, "pending": len(self._timers)}
+
+    def _fire(self, key):
+        with self._lock:
+            self._timers.pop(key, None)
+        self.calls += 1
+        try:
+            self.callback(key)
+        except Exception as e:
+            print(f"Error in debounced call: {str(e)}")
+        finally:
+            # Each window runs on a fresh timer thread
+            connections.close_all()
@@ -0,0 +1,62 @@
+import threading
+
+from .models import DEFAULT_DEVICE, device
+
+TOPIC_PREFIX = "Freshyfishy"
+
+# deviceId <-> primary key, devices are never renamed so this never expires
+_ids = {"by_id": {}, "by_pk": {}}
+_lock = threading.Lock()
+
+
+def remember(deviceId, pk):
+    with _lock:
+        _ids["by_id"][deviceId] = pk
+        _ids["by_pk"][pk] = deviceId
+
+
+# Primary key of a device. Ingest registers unknown devices the first time
+# they publish; elsewhere an unknown id raises device.DoesNotExist.
+def device_pk(deviceId=DEFAULT_DEVICE, create=False):
+    pk = _ids["by_id"].get(deviceId)
+    if pk is None:
+        if create or deviceId == DEFAULT_DEVICE:
+            found, _ = device.objects.get_or_create(deviceId=deviceId)
+        else:
+            found = device.objects.get(deviceId=deviceId)
+        pk = found.pk
+        remember(deviceId, pk)
+    return pk
+
+
+def device_name(pk):
+    deviceId = _ids["by_pk"].get(pk)
+    if deviceId is None:
+        deviceId = device.objects.values_list("deviceId", flat=True).get(pk=pk)
+        remember(deviceId, pk)
+    return deviceId
+
+
+# The original firmware uses Freshyfishy/<topic>, every other tank
+# Freshyfishy/<deviceId>/<topic>
+def device_topic(deviceId, suffix):
+    if deviceId == DEFAULT_DEVICE:
+        return f"{TOPIC_PREFIX}/{suffix}"
+    return f"{TOPIC_PREFIX}/{deviceId}/{suffix}"
+
+
+def parse_topic(topic):
+    parts = topic.split("/")
+    if len(parts) == 2:
+        return DEFAULT_DEVICE, parts[1]
+    if len(parts) == 3:
+        return parts[1], parts[2]
+    return None, None
+
+
+def subscription_topics(suffixes):
+    topics = []
+    for suffix in suffixes:
+        topics.append(f"{TOPIC_PREFIX}/{suffix}")
+        topics.append(f"{TOPIC_PREFIX}/+/{suffix}")
+    return topics
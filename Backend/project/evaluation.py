@@ -0,0 +1,100 @@
+import math
+from django.db.models import Case, Q, Value, When
+
+from .models import sensorData
+from .preferences import get_thresholds
+
+# (notice name, reading field, Green range, Orange range). A value outside
+# the Orange range is Red, outside the Green range it is Orange.
+METRIC_RULES = [
+    ("Temperature", "temp", ("minGrnTemp", "maxGrnTemp"), ("minOrgTemp", "maxOrgTemp")),
+    ("pH", "ph", ("minGrnPh", "maxGrnPh"), ("minOrgPh", "maxOrgPh")),
+    ("TDS", "tds", ("minGrnTds", "maxGrnTds"), ("minOrgTds", "maxOrgTds")),
+    ("Water Level", "waterLv", ("grnWaterLv", None), ("orgWaterLv", 100)),
+]
+SEVERITY = {"Green": 0, "Orange": 1, "Red": 2}
+
+
+def bound(thresholds, key, default):
+    if key is None:
+        return default
+    if isinstance(key, str):
+        return getattr(thresholds, key)
+    return float(key)
+
+
+def outside_range(field, low, high):
+    condition = Q()
+    if low != -math.inf:
+        condition |= Q(**{f"{field}__lt": low})
+    if high != math.inf:
+        condition |= Q(**{f"{field}__gt": high})
+    return condition
+
+
+class RuleSet:
+    # Thresholds compiled into plain (low, high) pairs per metric
+    def __init__(self, thresholds):
+        self.version = thresholds.version
+        self.metrics = []
+        for name, field, green, orange in METRIC_RULES:
+            self.metrics.append((
+                name,
+                field,
+                (bound(thresholds, green[0], -math.inf), bound(thresholds, green[1], math.inf)),
+                (bound(thresholds, orange[0], -math.inf), bound(thresholds, orange[1], math.inf)),
+            ))
+
+    def grade(self, value, green, orange):
+        if value < orange[0] or value > orange[1]:
+            return "Red"
+        if value < green[0] or value > green[1]:
+            return "Orange"
+        return "Green"
+
+    # Overall eval plus the per-metric notice list, Red notices first
+    def evaluate(self, temp, ph, tds, waterLv):
+        values = {"temp": temp, "ph": ph, "tds": tds, "waterLv": waterLv}
+        overall = "Green"
+        notices = []
+        for name, field, green, orange in self.metrics:
+            state = self.grade(values[field], green, orange)
+            if state != "Green":
+                notices.append((state, name))
+            if SEVERITY[state] > SEVERITY[overall]:
+                overall = state
+
+        notices.sort(key=lambda notice: -SEVERITY[notice[0]])
+        return overall, [{name: state} for state, name in notices]
+
+    # The same rules as a SQL CASE, to re-grade many rows in one UPDATE
+    def sql_case(self):
+        red = Q()
+        orange = Q()
+        for _, field, green, orange_range in self.metrics:
+            red |= outside_range(field, *orange_range)
+            orange |= outside_range(field, *green)
+        return Case(
+            When(red, then=Value("Red")),
+            When(orange, then=Value("Orange")),
+            default=Value("Green"),
+        )
+
+
+# Compiled rule set per device, rebuilt when its thresholds change
+_rules = {}
+
+
+def get_rules(device_id):
+    thresholds = get_thresholds(device_id)
+    ruleset = _rules.get(device_id)
+    if ruleset is None or ruleset.version != thresholds.version:
+        ruleset = RuleSet(thresholds)
+        _rules[device_id] = ruleset
+    return ruleset
+
+
+def regrade_sensor_data(device_id, since):
+    return sensorData.objects.filter(device_id=device_id, recorded_at__gte=since).update(
+        eval=get_rules(device_id).sql_case()
+    )
@@ -0,0 +1,132 @@
+import asyncio
+import functools
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+EVENTS_CHANNEL = "freshyfishy:events"
+
+# listener -> device it follows, None for every device
+_listeners = {}
+_lock = threading.Lock()
+_relay = {"thread": None, "redis": None}
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def get_redis():
+    if _relay["redis"] is None:
+        import redis
+
+        _relay["redis"] = redis.Redis.from_url(settings.REDIS_URL)
+    return _relay["redis"]
+
+
+# Called from any process (ingest, web workers, scheduler). The frame is
+# formatted once here and passed through unchanged to every client. Events
+# of one tank carry its deviceId, in the data and ahead of the frame on the
+# channel, so clients of other tanks skip them without parsing.
+def publish_event(event, data, device=None):
+    if device:
+        data = {**data, "device": device}
+    message = format_event(event, data)
+    try:
+        if settings.REDIS_URL:
+            get_redis().publish(EVENTS_CHANNEL, f"{device or ''}\n{message}")
+        else:
+            # No Redis: only clients of this process see the event
+            deliver(message, device)
+    except Exception as e:
+        print(f"Error publishing {event} event: {str(e)}")
+
+
+def offer(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # A client that stopped reading misses events rather than
+        # growing the queue, it gets the current state on reconnect
+        pass
+
+
+def deliver(message, device=None):
+    with _lock:
+        listeners = [
+            listener for listener, follows in _listeners.items()
+            if device is None or follows is None or follows == device
+        ]
+    for listener in listeners:
+        try:
+            listener(message)
+        except Exception as e:
+            print(f"Error delivering event: {str(e)}")
+
+
+def parse_event(message):
+    event, data = message.strip().split("\n", 1)
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+# Server-side consumers (e.g. the scheduler) get (event, data) callbacks on
+# the relay thread, or on the publishing thread when there is no Redis
+def add_listener(callback):
+    def listener(message):
+        callback(*parse_event(message))
+
+    start_relay()
+    with _lock:
+        _listeners[listener] = None
+    return listener
+
+
+def remove_listener(listener):
+    with _lock:
+        _listeners.pop(listener, None)
+
+
+# One Redis subscription per process, fanned out to the local clients
+def relay():
+    while True:
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(EVENTS_CHANNEL)
+            for message in pubsub.listen():
+                device, frame = message["data"].decode("utf-8").split("\n", 1)
+                deliver(frame, device or None)
+        except Exception as e:
+            print(f"Event relay disconnected: {str(e)}")
+            time.sleep(1)
+
+
+def start_relay():
+    with _lock:
+        if settings.REDIS_URL and _relay["thread"] is None:
+            _relay["thread"] = threading.Thread(target=relay, name="event-relay", daemon=True)
+            _relay["thread"].start()
+
+
+# SSE body for one client: the initial frames, then every event of its tank
+# (and those not tied to one), with a comment line as keep-alive when
+# nothing happens
+async def event_stream(initial, device=None):
+    start_relay()
+    queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+    listener = functools.partial(asyncio.get_running_loop().call_soon_threadsafe, offer, queue)
+    with _lock:
+        _listeners[listener] = device
+
+    try:
+        for message in initial:
+            yield message
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), settings.EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        remove_listener(listener)
@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+
+from django.db import close_old_connections
+
+
+class SensorWriteBuffer:
+    # Bounded queue between the MQTT network thread and the database. A
+    # background flusher drains it in batches, so a slow INSERT never stalls
+    # paho's loop (and its keepalive pings).
+    def __init__(self, flush_callback, max_size=1000, batch_size=100,
+                 flush_interval=2.0, put_timeout=0.5, max_retries=3, retry_backoff=0.5):
+        self.flush_callback = flush_callback
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.retries = 0
+        self.last_flush_ms = 0.0
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sensor-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def put(self, item):
+        return self.put_batch([item])
+
+    # A batch (e.g. a replayed backlog) stays in one queue entry, so it is
+    # flushed together and written by one INSERT
+    def put_batch(self, items):
+        # Backpressure: block the caller briefly while the flusher catches up,
+        # then drop the readings rather than growing without bound.
+        try:
+            self.queue.put(list(items), timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += len(items)
+            print(f"Sensor buffer full, dropped {len(items)} reading(s) (total dropped: {self.dropped})")
+            return False
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "retries": self.retries,
+            "last_flush_ms": round(self.last_flush_ms, 1),
+        }
+
+    def _collect(self):
+        try:
+            batch = self.queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.extend(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            # Drops a connection the previous attempt left broken
+            close_old_connections()
+            self.flush_callback(batch)
+            return True
+        except Exception as e:
+            print(f"Error flushing {len(batch)} sensor readings: {str(e)}")
+            return False
+
+    # The callback must write all of a batch or nothing, so a failed batch
+    # can be retried. A database hiccup is retried with backoff; a batch
+    # that still fails is written reading by reading, so only readings that
+    # fail on their own are lost.
+    def _flush(self, batch):
+        started = time.monotonic()
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.retries += 1
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                if self._write(batch):
+                    self.written += len(batch)
+                    self.batches += 1
+                    return
+
+            for item in batch:
+                if self._write([item]):
+                    self.written += 1
+                else:
+                    self.dropped += 1
+            self.batches += 1
+        finally:
+            self.last_flush_ms = (time.monotonic() - started) * 1000
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+        # Drain whatever is left so a clean shutdown loses nothing
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.extend(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._flush(batch)
@@ -0,0 +1,89 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, close_old_connections
+from django.db.models import Q
+from django.db.models.functions import Now
+
+from .models import leaderLease
+
+
+class LeaderLease:
+    # Leader election on a lease row. Every replica runs one of these; the
+    # holder renews the row every ttl/3 seconds using the database clock,
+    # and any other replica takes over once the lease has expired. A holder
+    # that cannot renew steps down straight away, before its lease runs out.
+    def __init__(self, name, on_elected, on_revoked, ttl=30):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_revoked = on_revoked
+        self.ttl = timedelta(seconds=ttl)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        self.is_leader = False
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-lease", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._step_down()
+        try:
+            leaderLease.objects.filter(name=self.name, holder=self.holder).update(
+                expiresAt=Now()
+            )
+        except Exception as e:
+            print(f"Error releasing {self.name} lease: {str(e)}")
+
+    def try_acquire(self):
+        updated = (
+            leaderLease.objects.filter(name=self.name)
+            .filter(Q(holder=self.holder) | Q(expiresAt__lt=Now()))
+            .update(holder=self.holder, expiresAt=Now() + self.ttl)
+        )
+        if updated:
+            return True
+        try:
+            _, created = leaderLease.objects.get_or_create(
+                name=self.name,
+                defaults={"holder": self.holder, "expiresAt": Now() + self.ttl},
+            )
+            return created
+        except IntegrityError:
+            # Another replica created it first
+            return False
+
+    def _run(self):
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                acquired = self.try_acquire()
+            except Exception as e:
+                print(f"Error renewing {self.name} lease: {str(e)}")
+                acquired = False
+
+            if acquired and not self.is_leader:
+                self.is_leader = True
+                print(f"{self.holder} is now the {self.name} leader")
+                self.on_elected()
+            elif not acquired:
+                self._step_down()
+
+            self._stopped.wait(self.ttl.total_seconds() / 3)
+
+    def _step_down(self):
+        if self.is_leader:
+            self.is_leader = False
+            print(f"{self.holder} is no longer the {self.name} leader")
+            self.on_revoked()
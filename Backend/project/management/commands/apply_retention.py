@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from project.retention import apply_retention
+
+
+class Command(BaseCommand):
+    help = "Compact and purge sensor history older than the retention settings"
+
+    def handle(self, *args, **options):
+        report = apply_retention()
+        for name, count in report.items():
+            self.stdout.write(f"{name}: {count}")
@@ -0,0 +1,116 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from project.devices import device_pk
+from project.models import sensorData
+
+SECONDS_BETWEEN_READINGS = 5
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed_rows(start, count):
+    # Readings of the default tank go back in time from now, one every few
+    # seconds
+    device_id = device_pk()
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO "{sensorData._meta.db_table}" '
+                '(device_id, timestamp, recorded_at, temp, ph, tds, "waterLv", eval) '
+                "SELECT %s, now() - g * %s * interval '1 second', "
+                "now() - g * %s * interval '1 second', "
+                "25 + random() * 3, 7 + random(), 250 + random() * 200, 90, "
+                "(ARRAY['Green', 'Orange', 'Red'])[1 + g %% 3] "
+                "FROM generate_series(%s, %s) AS g",
+                [device_id, SECONDS_BETWEEN_READINGS, SECONDS_BETWEEN_READINGS, start, start + count - 1],
+            )
+            cursor.execute(f'ANALYZE "{sensorData._meta.db_table}"')
+        return
+
+    now = timezone.now()
+    batch = []
+    for g in range(start, start + count):
+        recorded_at = now - timedelta(seconds=g * SECONDS_BETWEEN_READINGS)
+        batch.append(
+            sensorData(
+                device_id=device_id, timestamp=recorded_at, recorded_at=recorded_at,
+                temp=25, ph=7.5, tds=300, waterLv=90,
+            )
+        )
+        if len(batch) == 10000:
+            sensorData.objects.bulk_create(batch)
+            batch = []
+    sensorData.objects.bulk_create(batch)
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark latest() and report range scans on sensorData at growing "
+        "table sizes. Seeded rows are rolled back when the run finishes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[100000, 1000000, 10000000],
+            help="Table sizes (rows) to measure at",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--range-hours", type=int, default=24,
+            help="Width of the report range scan",
+        )
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        range_hours = options["range_hours"]
+
+        def latest():
+            sensorData.objects.latest("recorded_at")
+
+        def report_range():
+            end = timezone.now()
+            start = end - timedelta(hours=range_hours)
+            list(
+                sensorData.objects.filter(recorded_at__range=(start, end))
+                .values("timestamp", "temp", "ph", "tds", "waterLv", "eval")
+                .order_by("recorded_at")
+            )
+
+        self.stdout.write(f"{'rows':>12} {'latest() ms':>12} {'report ms':>12}  plan")
+        try:
+            with transaction.atomic():
+                seeded = sensorData.objects.count()
+                for size in sorted(options["sizes"]):
+                    if size > seeded:
+                        seed_rows(seeded, size - seeded)
+                        seeded = size
+
+                    plan = sensorData.objects.order_by("-recorded_at")[:1].explain()
+                    scan = next(
+                        (line.strip() for line in plan.splitlines() if "Scan" in line),
+                        plan.splitlines()[0],
+                    )
+                    self.stdout.write(
+                        f"{seeded:>12} {measure(latest, repeat):>12.2f} "
+                        f"{measure(report_range, repeat):>12.2f}  {scan}"
+                    )
+                raise Rollback()
+        except Rollback:
+            self.stdout.write("Seeded rows rolled back.")
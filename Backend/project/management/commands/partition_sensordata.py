@@ -0,0 +1,139 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from project.models import sensorData
+
+PARTITION_COLUMN = "recorded_at"
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(value):
+    if value.month == 12:
+        return date(value.year + 1, 1, 1)
+    return date(value.year, value.month + 1, 1)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = %s",
+        [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def create_monthly_partitions(cursor, table, first_month, last_month):
+    created = []
+    month = first_month
+    while month <= last_month:
+        name = f"{table}_{month:%Y%m}"
+        cursor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [month, next_month(month)],
+        )
+        created.append(name)
+        month = next_month(month)
+    return created
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert sensorData into a table range-partitioned by month (PostgreSQL "
+        "only) and create partitions ahead of time. Safe to re-run monthly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead", type=int, default=3,
+            help="Number of future monthly partitions to create",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning is only supported on PostgreSQL")
+
+        table = sensorData._meta.db_table
+        today = date.today()
+        last_month = month_start(today)
+        for _ in range(options["ahead"]):
+            last_month = next_month(last_month)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if is_partitioned(cursor, table):
+                created = create_monthly_partitions(
+                    cursor, table, month_start(today), last_month
+                )
+                self.stdout.write(f"{table} already partitioned, ensured {len(created)} partitions")
+                return
+
+            legacy = f"{table}_legacy"
+            sequence = f"{table}_part_id_seq"
+
+            cursor.execute(f"SELECT MIN({PARTITION_COLUMN}) FROM \"{table}\"")
+            oldest = cursor.fetchone()[0] or today
+
+            # Build the partitioned copy next to the old table, then swap.
+            cursor.execute(f'LOCK TABLE "{table}" IN EXCLUSIVE MODE')
+            cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+            cursor.execute(
+                f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS) '
+                f"PARTITION BY RANGE ({PARTITION_COLUMN})"
+            )
+            cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{sequence}"')
+            cursor.execute(
+                f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval(\'"{sequence}"\')'
+            )
+            cursor.execute(f'ALTER SEQUENCE "{sequence}" OWNED BY "{table}".id')
+
+            created = create_monthly_partitions(
+                cursor, table, month_start(oldest), last_month
+            )
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT'
+            )
+
+            cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+            cursor.execute(
+                f"SELECT setval('\"{sequence}\"', COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)"
+            )
+            cursor.execute(f'DROP TABLE "{legacy}"')
+
+            # Constraint and index names are only free once the old table is
+            # gone. Created on the parent, they cascade to every partition.
+            cursor.execute(
+                f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, {PARTITION_COLUMN})'
+            )
+            for index in sensorData._meta.indexes:
+                columns = ", ".join(
+                    f'"{sensorData._meta.get_field(name).column}"' for name in index.fields
+                )
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{index.name}" ON "{table}" ({columns})'
+                )
+
+            for constraint in sensorData._meta.constraints:
+                columns = ", ".join(
+                    f'"{sensorData._meta.get_field(name).column}"' for name in constraint.fields
+                )
+                cursor.execute(
+                    f'ALTER TABLE "{table}" ADD CONSTRAINT "{constraint.name}" UNIQUE ({columns})'
+                )
+
+            # LIKE copies no foreign keys, add them back on the parent
+            for field in sensorData._meta.concrete_fields:
+                if field.remote_field is None:
+                    continue
+                target = field.remote_field.model._meta
+                cursor.execute(
+                    f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_{field.column}_fk" '
+                    f'FOREIGN KEY ("{field.column}") REFERENCES "{target.db_table}" '
+                    f'("{target.pk.column}") DEFERRABLE INITIALLY DEFERRED'
+                )
+
+        self.stdout.write(f"Partitioned {table} into {len(created)} monthly partitions")
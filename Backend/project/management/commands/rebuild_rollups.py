@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from project.devices import device_pk
+from project.models import device
+from project.reports import parse_report_time
+from project.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly and daily sensorData rollups from raw readings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First day to rebuild")
+        parser.add_argument("--to", dest="end", help="Day to stop at (exclusive)")
+        parser.add_argument("--device", help="Only this deviceId (default: every device)")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_report_time(options["start"])
+            end = parse_report_time(options["end"])
+            device_id = device_pk(options["device"]) if options["device"] else None
+        except (ValueError, device.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        count = rebuild_rollups(start, end, device_id=device_id)
+        self.stdout.write(f"Rebuilt {count} rollup rows")
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from project.mqtt_client import (
+    INGEST_TOPICS,
+    ingest_stats,
+    mqtt_client_instance,
+    publish_ingest_stats,
+    sensor_buffer,
+    setup_sensor,
+)
+from project.notifications import dispatcher
+
+STATS_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Own the MQTT broker connection and store incoming device data"
+
+    def handle(self, *args, **options):
+        setup_sensor()
+        self.stdout.write(f"Ingesting from: {', '.join(INGEST_TOPICS)}")
+
+        try:
+            last_stats = last_published = time.monotonic()
+            while True:
+                time.sleep(1)
+                if time.monotonic() - last_published >= settings.INGEST_STATS_INTERVAL:
+                    last_published = time.monotonic()
+                    publish_ingest_stats()
+                if time.monotonic() - last_stats >= STATS_INTERVAL:
+                    last_stats = time.monotonic()
+                    self.stdout.write(f"Ingest: {ingest_stats()}")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping ingest...")
+        finally:
+            mqtt_client_instance.loop_stop()
+            mqtt_client_instance.router.stop()
+            sensor_buffer.stop()
+            dispatcher.stop()
+            self.stdout.write(f"Sensor buffer: {sensor_buffer.stats()}")
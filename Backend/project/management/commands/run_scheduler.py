@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from project.notifications import dispatcher
+from project.scheduler import schedule_runner, scheduler_lease, start_scheduler, stop_scheduler
+
+STATS_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Run scheduled tasks, one replica at a time through a database lease"
+
+    def handle(self, *args, **options):
+        start_scheduler()
+        self.stdout.write(f"Scheduler started as {scheduler_lease.holder}")
+
+        try:
+            last_stats = time.monotonic()
+            while True:
+                time.sleep(1)
+                if time.monotonic() - last_stats >= STATS_INTERVAL:
+                    last_stats = time.monotonic()
+                    role = "leader" if scheduler_lease.is_leader else "standby"
+                    self.stdout.write(f"Scheduler ({role}): {schedule_runner.stats()}")
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping scheduler...")
+        finally:
+            # Releasing the lease lets a standby take over right away
+            stop_scheduler()
+            dispatcher.stop()
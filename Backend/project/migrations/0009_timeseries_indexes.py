@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0008_userpreferences_tankheight"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="feedingdata",
+            index=models.Index(fields=["timestamp"], name="feedingdata_timestamp_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lightdata",
+            index=models.Index(fields=["timestamp"], name="lightdata_timestamp_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sensordata",
+            index=models.Index(fields=["timestamp"], name="sensordata_timestamp_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sensordata",
+            index=models.Index(
+                fields=["eval", "timestamp"], name="sensordata_eval_ts_idx"
+            ),
+        ),
+    ]
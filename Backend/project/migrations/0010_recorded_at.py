@@ -0,0 +1,120 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:24
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_timestamps(apps, schema_editor):
+    # Existing rows were ingested at their (last) timestamp
+    for name in ["feedingData", "lightData", "sensorData", "schedule", "userToken"]:
+        apps.get_model("project", name).objects.update(recorded_at=F("timestamp"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0009_timeseries_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="feedingdata",
+            name="feedingdata_timestamp_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="lightdata",
+            name="lightdata_timestamp_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="sensordata",
+            name="sensordata_timestamp_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="sensordata",
+            name="sensordata_eval_ts_idx",
+        ),
+        migrations.AddField(
+            model_name="feedingdata",
+            name="recorded_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="lightdata",
+            name="recorded_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="schedule",
+            name="recorded_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="sensordata",
+            name="measured_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="sensordata",
+            name="recorded_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.AddField(
+            model_name="usertoken",
+            name="recorded_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+        migrations.RunPython(copy_timestamps, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="feedingdata",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="lightdata",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="schedule",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="sensordata",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="usertoken",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="feedingdata",
+            index=models.Index(fields=["recorded_at"], name="feedingdata_recorded_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lightdata",
+            index=models.Index(fields=["recorded_at"], name="lightdata_recorded_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sensordata",
+            index=models.Index(fields=["recorded_at"], name="sensordata_recorded_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="sensordata",
+            index=models.Index(
+                fields=["eval", "recorded_at"], name="sensordata_eval_rec_idx"
+            ),
+        ),
+    ]
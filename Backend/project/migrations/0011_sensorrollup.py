@@ -0,0 +1,65 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0010_recorded_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="sensorRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "grain",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=10
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.IntegerField(default=0)),
+                ("lastRecordedAt", models.DateTimeField(null=True)),
+                ("sumTemp", models.FloatField(default=0)),
+                ("minTemp", models.FloatField(null=True)),
+                ("maxTemp", models.FloatField(null=True)),
+                ("lastTemp", models.FloatField(null=True)),
+                ("sumPh", models.FloatField(default=0)),
+                ("minPh", models.FloatField(null=True)),
+                ("maxPh", models.FloatField(null=True)),
+                ("lastPh", models.FloatField(null=True)),
+                ("sumTds", models.FloatField(default=0)),
+                ("minTds", models.FloatField(null=True)),
+                ("maxTds", models.FloatField(null=True)),
+                ("lastTds", models.FloatField(null=True)),
+                ("sumWaterLv", models.FloatField(default=0)),
+                ("minWaterLv", models.FloatField(null=True)),
+                ("maxWaterLv", models.FloatField(null=True)),
+                ("lastWaterLv", models.FloatField(null=True)),
+                ("greenCount", models.IntegerField(default=0)),
+                ("orangeCount", models.IntegerField(default=0)),
+                ("redCount", models.IntegerField(default=0)),
+                ("greenMinutes", models.FloatField(default=0)),
+                ("orangeMinutes", models.FloatField(default=0)),
+                ("redMinutes", models.FloatField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("grain", "bucket"),
+                        name="sensorrollup_grain_bucket_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
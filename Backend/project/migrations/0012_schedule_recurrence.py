@@ -0,0 +1,111 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:40
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def unshift_everyday(apps, schema_editor):
+    # Everyday rows used to be moved to tomorrow after running; the run
+    # they already made today is now computed from the original date and
+    # logged, so the scheduler does not feed or switch the light twice
+    schedule = apps.get_model("project", "schedule")
+    scheduleRun = apps.get_model("project", "scheduleRun")
+    shifted = schedule.objects.filter(freq="Everyday", status="Success")
+    runs = [
+        scheduleRun(
+            schedule_id=task.id,
+            dueAt=datetime.datetime.combine(
+                task.workingDate - datetime.timedelta(days=1), task.workingTime
+            ),
+            status="Success",
+        )
+        for task in shifted
+    ]
+    shifted.update(
+        status="Pending", workingDate=F("workingDate") - datetime.timedelta(days=1)
+    )
+    scheduleRun.objects.bulk_create(runs)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0011_sensorrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="schedule",
+            name="interval",
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name="schedule",
+            name="freq",
+            field=models.CharField(
+                choices=[
+                    ("Today", "Today"),
+                    ("Everyday", "Everyday"),
+                    ("Weekdays", "Weekdays"),
+                    ("Hourly", "Hourly"),
+                ],
+                default="Today",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="scheduleRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("timestamp", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "recorded_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+                ("dueAt", models.DateTimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("Success", "Success"),
+                            ("Failed", "Failed"),
+                            ("Missed", "Missed"),
+                            ("Skipped", "Skipped"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("result", models.CharField(blank=True, default="", max_length=255)),
+                (
+                    "schedule",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="runs",
+                        to="project.schedule",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["dueAt"], name="schedulerun_due_idx")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("schedule", "dueAt"), name="schedulerun_unique_due"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(unshift_everyday, migrations.RunPython.noop),
+    ]
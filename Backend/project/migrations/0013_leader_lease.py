@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0012_schedule_recurrence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="leaderLease",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("holder", models.CharField(max_length=100)),
+                ("expiresAt", models.DateTimeField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="schedulerun",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Running", "Running"),
+                    ("Success", "Success"),
+                    ("Failed", "Failed"),
+                    ("Missed", "Missed"),
+                    ("Skipped", "Skipped"),
+                ],
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,191 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def assign_default_device(apps, schema_editor):
+    # Everything recorded so far belongs to the one tank on the bare topics
+    device = apps.get_model("project", "device")
+    default, _ = device.objects.get_or_create(deviceId="default")
+    for name in ["feedingData", "lightData", "schedule", "sensorData", "sensorRollup"]:
+        apps.get_model("project", name).objects.update(device=default)
+
+    # Readers used the last preferences row, one per device from now on
+    userPreferences = apps.get_model("project", "userPreferences")
+    current = userPreferences.objects.order_by("id").last()
+    if current:
+        userPreferences.objects.exclude(id=current.id).delete()
+        current.device = default
+        current.save()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0013_leader_lease"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="device",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("timestamp", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "recorded_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+                ("deviceId", models.CharField(max_length=50, unique=True)),
+                ("name", models.CharField(blank=True, default="", max_length=100)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name="sensorrollup",
+            name="sensorrollup_grain_bucket_uniq",
+        ),
+        migrations.AddField(
+            model_name="feedingdata",
+            name="device",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="project.device",
+            ),
+        ),
+        migrations.AddField(
+            model_name="lightdata",
+            name="device",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="project.device",
+            ),
+        ),
+        migrations.AddField(
+            model_name="schedule",
+            name="device",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="project.device",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sensordata",
+            name="device",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="project.device",
+            ),
+        ),
+        migrations.AddField(
+            model_name="sensorrollup",
+            name="device",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="project.device",
+            ),
+        ),
+        migrations.AddField(
+            model_name="userpreferences",
+            name="device",
+            field=models.OneToOneField(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="preferences",
+                to="project.device",
+            ),
+        ),
+        migrations.RunPython(assign_default_device, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="feedingdata",
+            name="device",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="project.device"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="lightdata",
+            name="device",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="project.device"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="schedule",
+            name="device",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="project.device"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sensordata",
+            name="device",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="project.device"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="sensorrollup",
+            name="device",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="project.device"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="userpreferences",
+            name="device",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="preferences",
+                to="project.device",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="feedingdata",
+            index=models.Index(
+                fields=["device", "recorded_at"], name="feedingdata_device_rec_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lightdata",
+            index=models.Index(
+                fields=["device", "recorded_at"], name="lightdata_device_rec_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sensordata",
+            index=models.Index(
+                fields=["device", "recorded_at"], name="sensordata_device_rec_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sensordata",
+            index=models.Index(
+                fields=["device", "timestamp"], name="sensordata_device_ts_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="sensorrollup",
+            constraint=models.UniqueConstraint(
+                fields=("device", "grain", "bucket"),
+                name="sensorrollup_device_bucket_uniq",
+            ),
+        ),
+    ]
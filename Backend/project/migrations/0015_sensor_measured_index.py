@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0014_devices"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sensordata",
+            index=models.Index(
+                fields=["device", "measured_at"], name="sensordata_device_meas_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("project", "0015_sensor_measured_index"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="sensordata",
+            constraint=models.UniqueConstraint(
+                fields=("device", "measured_at", "recorded_at"),
+                name="sensordata_device_meas_uniq",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="sensordata",
+            name="sensordata_device_meas_idx",
+        ),
+    ]
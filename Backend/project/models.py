@@ -1,15 +1,44 @@
 from django.db import models
+from django.utils import timezone
 
 class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
 
-    timestamp = models.DateTimeField(auto_now=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    # When the row happened: ingest time, or for a sensor reading that
+    # carries its device time (measured_at) that time, capped at ingest
+    # time. Set once and never updated.
+    recorded_at = models.DateTimeField(default=timezone.now, editable=False)
+
+# Topic segment of the tank that still uses the original Freshyfishy/<topic>
+DEFAULT_DEVICE = 'default'
+
+# One aquarium controller, publishing on Freshyfishy/<deviceId>/<topic>
+class device(TimeStampedModel):
+    deviceId = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=100, blank=True, default='')
 
 class feedingData(TimeStampedModel):
+    class Meta:
+        indexes = [
+            models.Index(fields=["recorded_at"], name="feedingdata_recorded_idx"),
+            models.Index(fields=["device", "recorded_at"], name="feedingdata_device_rec_idx"),
+        ]
+
+    device = models.ForeignKey(device, on_delete=models.CASCADE)
+
     data = models.CharField(max_length=255)
     
 class lightData(TimeStampedModel):
+    class Meta:
+        indexes = [
+            models.Index(fields=["recorded_at"], name="lightdata_recorded_idx"),
+            models.Index(fields=["device", "recorded_at"], name="lightdata_device_rec_idx"),
+        ]
+
+    device = models.ForeignKey(device, on_delete=models.CASCADE)
+
     class Status(models.TextChoices):
         ON = 'ON'
         OFF = 'OFF'
@@ -22,21 +51,86 @@ class lightData(TimeStampedModel):
     color = models.CharField(max_length=50, default='rgb(245, 255, 197)')
 
 class sensorData(TimeStampedModel):
+    class Meta:
+        indexes = [
+            models.Index(fields=["recorded_at"], name="sensordata_recorded_idx"),
+            models.Index(fields=["eval", "recorded_at"], name="sensordata_eval_rec_idx"),
+            models.Index(fields=["device", "recorded_at"], name="sensordata_device_rec_idx"),
+            models.Index(fields=["device", "timestamp"], name="sensordata_device_ts_idx"),
+        ]
+        constraints = [
+            # A replayed reading is stored once. recorded_at is part of the
+            # key because a partitioned table only allows unique keys that
+            # include the partition column; the index also serves the
+            # (device, measured_at) dedupe lookups.
+            models.UniqueConstraint(
+                fields=["device", "measured_at", "recorded_at"], name="sensordata_device_meas_uniq"
+            ),
+        ]
+
     class Evaluate(models.TextChoices):
         Green = 'Green'
         Orange = 'Orange'
         Red = 'Red'
         
+    device = models.ForeignKey(device, on_delete=models.CASCADE)
     temp = models.FloatField(default=0)
     ph = models.FloatField(default=0)
     tds = models.FloatField(default=0)
     waterLv = models.FloatField(default=0)
+    # Device-side time of the reading, when the payload carries one
+    measured_at = models.DateTimeField(null=True, blank=True)
     eval = models.CharField(
         max_length = 255, 
         choices = Evaluate.choices,
         default = Evaluate.Green,)
     
+# Hourly / daily aggregates of sensorData, kept up to date at ingest
+class sensorRollup(models.Model):
+    class Grain(models.TextChoices):
+        Hour = 'hour'
+        Day = 'day'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "grain", "bucket"], name="sensorrollup_device_bucket_uniq"),
+        ]
+
+    device = models.ForeignKey(device, on_delete=models.CASCADE)
+    grain = models.CharField(max_length=10, choices=Grain.choices)
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    lastRecordedAt = models.DateTimeField(null=True)
+
+    sumTemp = models.FloatField(default=0)
+    minTemp = models.FloatField(null=True)
+    maxTemp = models.FloatField(null=True)
+    lastTemp = models.FloatField(null=True)
+
+    sumPh = models.FloatField(default=0)
+    minPh = models.FloatField(null=True)
+    maxPh = models.FloatField(null=True)
+    lastPh = models.FloatField(null=True)
+
+    sumTds = models.FloatField(default=0)
+    minTds = models.FloatField(null=True)
+    maxTds = models.FloatField(null=True)
+    lastTds = models.FloatField(null=True)
+
+    sumWaterLv = models.FloatField(default=0)
+    minWaterLv = models.FloatField(null=True)
+    maxWaterLv = models.FloatField(null=True)
+    lastWaterLv = models.FloatField(null=True)
+
+    greenCount = models.IntegerField(default=0)
+    orangeCount = models.IntegerField(default=0)
+    redCount = models.IntegerField(default=0)
+    greenMinutes = models.FloatField(default=0)
+    orangeMinutes = models.FloatField(default=0)
+    redMinutes = models.FloatField(default=0)
+    
 class userPreferences(models.Model):
+    device = models.OneToOneField(device, on_delete=models.CASCADE, related_name='preferences')
     minGrnTemp = models.FloatField(default=22.0)
     maxGrnTemp = models.FloatField(default=28.0)
     minOrgTemp = models.FloatField(default=19.0)
@@ -67,10 +161,14 @@ class schedule(TimeStampedModel):
     class Frequency(models.TextChoices):
         Today = 'Today'
         Everyday = 'Everyday'
+        Weekdays = 'Weekdays'
+        Hourly = 'Hourly'
     class Status(models.TextChoices):
         Pending = 'Pending'
         Success = 'Success'
     
+    device = models.ForeignKey(device, on_delete=models.CASCADE)
+    # First occurrence; recurring schedules repeat from here (see recurrence.py)
     workingTime = models.TimeField(default='00:00')
     workingDate = models.DateField()
     desc = models.CharField(
@@ -85,3 +183,35 @@ class schedule(TimeStampedModel):
         max_length = 10,
         choices = Status.choices,
         default = Status.Pending,)
+    # Hours between runs of an Hourly schedule
+    interval = models.PositiveSmallIntegerField(default=1)
+
+# One row per executed, missed or skipped occurrence of a schedule
+class scheduleRun(TimeStampedModel):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["schedule", "dueAt"], name="schedulerun_unique_due"),
+        ]
+        indexes = [
+            models.Index(fields=["dueAt"], name="schedulerun_due_idx"),
+        ]
+
+    class Status(models.TextChoices):
+        Running = 'Running'
+        Success = 'Success'
+        Failed = 'Failed'
+        Missed = 'Missed'
+        Skipped = 'Skipped'
+
+    schedule = models.ForeignKey(schedule, on_delete=models.CASCADE, related_name='runs')
+    dueAt = models.DateTimeField()
+    status = models.CharField(
+        max_length = 10,
+        choices = Status.choices,)
+    result = models.CharField(max_length=255, blank=True, default='')
+
+# Time-limited lock naming the one process allowed to run a singleton job
+class leaderLease(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField(max_length=100)
+    expiresAt = models.DateTimeField()
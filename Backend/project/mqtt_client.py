@@ -1,21 +1,66 @@
 import paho.mqtt.client as mqtt
-import time
+import functools
 import json
+import time
 from .models import *
+from .alerts import check_alerts
+from .device_commands import DeviceCommandRPC
+from .device_state import DebouncedCall, get_device_state
+from .devices import device_name, device_pk, device_topic, subscription_topics
+from .ingest import SensorWriteBuffer
+from .payloads import decode_sensor_payload
+from .evaluation import get_rules
+from .events import publish_event
+from .rollups import lock_devices, update_rollups
+from .tank_state import TANK_STATE_FIELDS, tank_state_changed, update_tank_state
+from .topic_router import POOL, TopicRouter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import datetime
 
 PUBLIC_MQTT_BROKER = "test.mosquitto.org"
 PUBLIC_MQTT_PORT = 1883
 
+# Topics owned by the ingest process (manage.py run_ingest), for every
+# device. Web workers only publish, so readings and display events are
+# stored exactly once.
+INGEST_TOPICS = subscription_topics([
+    "sensor",
+    "pump",
+    "reqstatus",
+    "waterLv",
+    "command",
+    "display",
+])
+
 
 class MQTTClient:
     def __init__(self):
         self.client = mqtt.Client()
-        self.response_data = None
-        self.response_received = False
+        self.subscriptions = set()
+        self.loop_running = False
 
+        self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
 
+        # Freshyfishy/[<deviceId>/]<suffix> -> handler(deviceId, payload).
+        # Anything that writes to the database runs on the worker lanes.
+        self.router = TopicRouter(
+            workers=settings.TOPIC_WORKERS, max_size=settings.TOPIC_QUEUE_SIZE
+        )
+        self.router.register("sensor", self.handle_sensor_data, text=False)
+        self.router.register("response", self.handle_device_response)
+        self.router.register("command", self.handle_device_command)
+        self.router.register("pump", self.handle_device_pump)
+        self.router.register("waterLv", self.handle_device_waterlv)
+        self.router.register("reqstatus", self.handle_device_status, POOL)
+        self.router.register("display", self.handle_device_display, POOL)
+        # Not a device topic: alert checks handed on by handle_sensor_data
+        self.router.register("alerts", self.handle_alerts, POOL)
+
     def connect(self):
         if not self.client.is_connected():
             try:
@@ -24,221 +69,334 @@ class MQTTClient:
             except Exception as e:
                 print(f"Connection to public broker failed: {str(e)}")
 
+        # The network loop is started lazily so that importing this module
+        # (every gunicorn worker does) never opens a broker connection.
+        self.loop_start()
+
+    def on_connect(self, client, userdata, flags, rc):
+        # Re-subscribe after a reconnect, the broker forgets clean sessions
+        for topic in self.subscriptions:
+            self.client.subscribe(topic)
+
+    # Any caller may publish first, the connection is opened on demand
     def publish(self, topic, message):
-        self.client.publish(topic, message)
+        self.connect()
+        result = self.client.publish(topic, message)
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            print(f"Publish to {topic} failed: {mqtt.error_string(result.rc)}")
+            return False
         print(f"Published to Public Broker: {topic} -> {message}")
+        return True
 
     def subscribe(self, topic):
+        if topic in self.subscriptions:
+            return
+        self.subscriptions.add(topic)
         self.client.subscribe(topic)
         print(f"Subscribed to Public Broker: {topic}")
 
     def loop_start(self):
-        self.client.loop_start()
+        if not self.loop_running:
+            self.client.loop_start()
+            self.loop_running = True
+
+    def loop_stop(self):
+        if self.loop_running:
+            self.client.loop_stop()
+            self.loop_running = False
+        self.client.disconnect()
 
     def on_message(self, client, userdata, message):
         topic = message.topic
-        payload = message.payload.decode("utf-8")
-        print(f"Received message on {topic}: {payload}")
-
-        if topic == "Freshyfishy/sensor":
-            self.handle_sensor_data(payload)
-        elif topic == "Freshyfishy/response":
-            self.handle_device_response(payload)
-        elif topic == "Freshyfishy/command":
-            self.handle_device_command(payload)
-        elif topic == "Freshyfishy/pump":
-            self.handle_device_pump(payload)
-        elif topic == "Freshyfishy/waterLv":
-            self.handle_device_waterlv(payload)
-        elif topic == "Freshyfishy/reqstatus":
-            self.handle_device_status(payload)
-        elif topic == "Freshyfishy/display":
-            self.handle_device_display(payload)
-
-    def handle_sensor_data(self, payload):
+        print(f"Received message on {topic} ({len(message.payload)} bytes)")
+
+        self.router.dispatch(topic, message.payload)
+
+    # JSON, MessagePack or the fixed struct layout, one reading or a batch
+    def handle_sensor_data(self, deviceId, payload):
         try:
-            data = json.loads(payload)
-            print(f"Received sensor data: {data}")
-            process_sensor_data(data)
+            format, readings = decode_sensor_payload(payload)
+            print(f"Received {len(readings)} sensor reading(s) from {deviceId} ({format})")
+            process_sensor_readings(readings, device_pk(deviceId, create=True))
         except Exception as e:
             print(f"Error processing sensor data: {str(e)}")
 
-    def handle_device_response(self, payload):
+    def handle_alerts(self, deviceId, reading):
+        check_alerts(
+            device_pk(deviceId), reading["temp"], reading["ph"], reading["tds"], reading["waterLv"]
+        )
+
+    def handle_device_response(self, deviceId, payload):
         try:
             print(f"Received response from IoT: {payload}")
-            self.response_data = payload
-            self.response_received = True
+            device_commands.resolve(payload, deviceId)
         except Exception as e:
             print(f"Error processing device response: {str(e)}")
 
-    def handle_device_command(self, payload):
+    def handle_device_command(self, deviceId, payload):
         print(f"Received command from IoT: {payload}")
 
-    def handle_device_pump(self, payload):
+    def handle_device_pump(self, deviceId, payload):
         print(f"Received pump command from IoT: {payload}")
+        publish_event("pump", {"message": payload}, device=deviceId)
         
-    def handle_device_waterlv(self, payload):
+    def handle_device_waterlv(self, deviceId, payload):
         print(f"Received water level from IoT: {payload}")
         
-    def handle_device_status(self, payload):
+    # Bursts of status requests are answered with one publish per window
+    def handle_device_status(self, deviceId, payload):
         print(f"Handling device status: {payload}")
-        latest_feed = feedingData.objects.latest("timestamp")
-        latest_light = lightData.objects.latest("timestamp")
-
-        response = {
-            "feed": latest_feed.timestamp.timestamp(),  
-            "light": latest_light.status, 
-            "color": latest_light.color
-        }
-
-        response_json = json.dumps(response)
-        self.publish("Freshyfishy/status", response_json)  
-        print(f"Published response: {response_json}")
+        status_publisher.request(device_pk(deviceId, create=True))
     
-    def update_status(self):
-        latest_feed = feedingData.objects.latest("timestamp")
-        latest_light = lightData.objects.latest("timestamp")
-
-        response = {
-            "feed": latest_feed.timestamp.timestamp(),  
-            "light": latest_light.status, 
-            "color": latest_light.color
-        }
+    def update_status(self, device_id):
+        status_publisher.request(device_id)
 
+    # Same payload to the device and to dashboard clients
+    def publish_device_status(self, device_id):
+        response = get_device_state(device_id)
         response_json = json.dumps(response)
-        self.publish("Freshyfishy/status", response_json)  
+        deviceId = device_name(device_id)
+        self.publish(device_topic(deviceId, "status"), response_json)
+        publish_event("status", response, device=deviceId)
         print(f"Published response: {response_json}")
         
-    def handle_device_display(self, payload):
+    def handle_device_display(self, deviceId, payload):
         print(f"Received display update from IoT: {payload}")
         data = json.loads(payload)  
+        device_id = device_pk(deviceId, create=True)
 
         if "feed" in data :
             timestamp = timezone.now()
-            feedingData.objects.create(timestamp=timestamp, data="Feed Successful!")
+            feedingData.objects.create(device_id=device_id, timestamp=timestamp, data="Feed Successful!")
             print(f"Stored feeding data: {data['feed']} at {timestamp}")
 
         if "light" in data :
             status = "ON" if "ON" in data["light"] else "OFF"
             
-            latest_light = lightData.objects.latest("timestamp")
-            latest_color = latest_light.color 
+            latest_color = get_device_state(device_id)["color"]
 
             timestamp = timezone.now()
-            lightData.objects.create(timestamp=timestamp, status=status, color=latest_color)
+            lightData.objects.create(device_id=device_id, timestamp=timestamp, status=status, color=latest_color)
             print(f"Updated light status: {status}, Color: {latest_color} at {timestamp}")
-        
-        latest_feed = feedingData.objects.latest("timestamp")
-        latest_light = lightData.objects.latest("timestamp")
-
-        response = {
-            "feed": latest_feed.timestamp.timestamp(),  
-            "light": latest_light.status, 
-            "color": latest_light.color
-        }
 
-        response_json = json.dumps(response)
-        self.publish("Freshyfishy/status", response_json)  
-        print(f"Published response: {response_json}")
+        status_publisher.request(device_id)
             
 
-    def reset_response_data(self):
-        self.response_data = None
-        self.response_received = False
 
-    def loop_until_response(self, timeout=30):
-        start_time = time.time()
-        while not self.response_received:
-            time.sleep(0.1)
-            if time.time() - start_time > timeout:
-                raise Exception("Response timeout")
-        return self.response_data
+mqtt_client_instance = MQTTClient()
 
+device_commands = DeviceCommandRPC(
+    mqtt_client_instance,
+    functools.partial(device_topic, suffix="command"),
+    subscription_topics(["response"]),
+    timeout=settings.DEVICE_COMMAND_TIMEOUT,
+    max_in_flight=settings.DEVICE_MAX_IN_FLIGHT,
+)
 
-mqtt_client_instance = MQTTClient()
+status_publisher = DebouncedCall(
+    mqtt_client_instance.publish_device_status, settings.DEVICE_STATUS_DEBOUNCE
+)
 
 
+# Only called by the run_ingest management command, never at import time
 def setup_sensor():
+    sensor_buffer.start()
+    mqtt_client_instance.router.start()
     mqtt_client_instance.connect()
 
-    mqtt_client_instance.subscribe("Freshyfishy/sensor")
-    mqtt_client_instance.subscribe("Freshyfishy/response")
-    mqtt_client_instance.subscribe("Freshyfishy/pump")
-    mqtt_client_instance.subscribe("Freshyfishy/reqstatus")
-    mqtt_client_instance.subscribe("Freshyfishy/waterLv")
-    mqtt_client_instance.subscribe("Freshyfishy/command")
-    mqtt_client_instance.subscribe("Freshyfishy/display")
+    for topic in INGEST_TOPICS:
+        mqtt_client_instance.subscribe(topic)
 
-    mqtt_client_instance.loop_start()
 
-setup_sensor()
+# Device-side time of a reading: epoch seconds from the ESP32 or an ISO string
+def parse_measured_at(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            measured_at = datetime.fromtimestamp(value)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f"Invalid measured_at: {value}")
+    else:
+        measured_at = parse_datetime(str(value))
+        if measured_at is None:
+            raise ValueError(f"Invalid measured_at: {value}")
+    if timezone.is_aware(measured_at):
+        measured_at = timezone.make_naive(measured_at)
+    return measured_at
 
 
-def process_sensor_data(data):
-    try:
-        # Ensure data is in dict format
-        if isinstance(data, dict):
-            print("Data received from MQTT")
-            temp = data.get("temp")
-            ph = data.get("ph")
-            tds = data.get("tds")
-            waterLv = data.get("waterLv")
-        else:
-            raise ValueError("Invalid data format")
-
-        # Fetch the latest user preferences
-        preferences = userPreferences.objects.last()
-        if not preferences:
-            raise ValueError("User preferences not found")
-
-        # Determine evaluation status
-        eval_status = "Green"
-        if (
-            temp < preferences.minOrgTemp
-            or temp > preferences.maxOrgTemp
-            or ph < preferences.minOrgPh
-            or ph > preferences.maxOrgPh
-            or tds < preferences.minOrgTds
-            or tds > preferences.maxOrgTds
-            or waterLv < preferences.orgWaterLv
-            or waterLv > 100
-        ):
-            eval_status = "Red"
-        elif (
-            temp < preferences.minGrnTemp
-            or temp > preferences.maxGrnTemp
-            or ph < preferences.minGrnPh
-            or ph > preferences.maxGrnPh
-            or tds < preferences.minGrnTds
-            or tds > preferences.maxGrnTds
-            or waterLv < preferences.grnWaterLv
-        ):
-            eval_status = "Orange"
-
-        # Log evaluated values
-        print(
-            f"Evaluated Data -> Temp: {temp}, pH: {ph}, TDS: {tds}, Water Level: {waterLv}, Eval: {eval_status}"
-        )
+# When a reading was taken: its device time, never later than when it
+# arrived (a device clock running ahead would date it in the future)
+def reading_time(measured_at, received):
+    return min(measured_at or received, received)
 
-        # Save the data to the database
-        sensorData.objects.create(
-            temp=temp,
-            ph=ph,
-            tds=tds,
-            waterLv=waterLv,
-            timestamp=timezone.now(),
-            eval=eval_status,
-        )
 
-        print("Sensor data processed and stored successfully.")
-        return {
-            "temp": temp,
-            "ph": ph,
-            "tds": tds,
-            "waterLv": waterLv,
-            "eval": eval_status,
-        }
+def process_sensor_readings(readings, device_id):
+    try:
+        received = timezone.now()
+        batch = []
+        for data in readings:
+            # One bad device time drops that reading, not the whole batch
+            try:
+                measured_at = parse_measured_at(data.get("measured_at"))
+            except ValueError as e:
+                print(f"Skipping sensor reading: {str(e)}")
+                continue
+            batch.append({
+                "device_id": device_id,
+                "temp": data.get("temp"),
+                "ph": data.get("ph"),
+                "tds": data.get("tds"),
+                "waterLv": data.get("waterLv"),
+                # Readings replayed after an outage keep the time they were
+                # taken, so rollups, reports and retention file them there
+                "timestamp": reading_time(measured_at, received),
+                "recorded_at": reading_time(measured_at, received),
+                "measured_at": measured_at,
+            })
+        if not batch:
+            return None
+
+        # Alerts are decided as the readings arrive, for the newest one only:
+        # a replayed backlog describes the past, not the tank right now. The
+        # check runs on the device's worker lane, the INSERT on the flusher
+        # thread, so neither holds up paho's network thread.
+        latest = max(batch, key=lambda reading: reading["timestamp"])
+        mqtt_client_instance.router.submit("alerts", device_name(device_id), latest)
+        if sensor_buffer.put_batch(batch):
+            return batch
+        return None
 
     except Exception as e:
         print(f"Error processing sensor data: {str(e)}")
         return None
+
+
+# Replays resend readings that may already be stored. Drops the ones whose
+# (device, measured_at) is already in the table or earlier in the batch.
+def unseen_readings(rows):
+    times = {}
+    for row in rows:
+        if row.measured_at is not None:
+            times.setdefault(row.device_id, set()).add(row.measured_at)
+
+    seen = set()
+    for device_id, measured in times.items():
+        stored = sensorData.objects.filter(device_id=device_id, measured_at__in=measured)
+        seen.update((device_id, value) for value in stored.values_list("measured_at", flat=True))
+
+    unseen = []
+    for row in rows:
+        key = (row.device_id, row.measured_at)
+        if row.measured_at is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        unseen.append(row)
+    return unseen
+
+
+# Every writer of sensor readings (the flusher, the sensorDataDisplay POST)
+# goes through here. The device rows are locked before the duplicate check,
+# so a reading cannot be inserted by another writer between check and
+# INSERT; the unique (device, measured_at, recorded_at) key backs this up.
+# Rows and rollups commit together, so a failed batch can be retried as a
+# whole. Returns the rows actually stored.
+def save_sensor_rows(rows):
+    with transaction.atomic():
+        lock_devices(sorted({row.device_id for row in rows}))
+        rows = unseen_readings(rows)
+        sensorData.objects.bulk_create(rows)
+        update_rollups(rows)
+    return rows
+
+
+def store_sensor_batch(readings):
+    rows = []
+    for reading in readings:
+        # Cached rule set per device, no database round-trip
+        eval_status, _ = get_rules(reading["device_id"]).evaluate(
+            reading["temp"], reading["ph"], reading["tds"], reading["waterLv"]
+        )
+        rows.append(
+            sensorData(
+                device_id=reading["device_id"],
+                temp=reading["temp"],
+                ph=reading["ph"],
+                tds=reading["tds"],
+                waterLv=reading["waterLv"],
+                timestamp=reading["timestamp"],
+                recorded_at=reading["recorded_at"],
+                measured_at=reading["measured_at"],
+                eval=eval_status,
+            )
+        )
+
+    # Save the batch with a single INSERT
+    rows = save_sensor_rows(rows)
+    if len(rows) < len(readings):
+        print(f"Skipped {len(readings) - len(rows)} sensor reading(s) already stored.")
+    if not rows:
+        return
+    print(f"Stored {len(rows)} sensor readings.")
+
+    # Newest reading per device, a replayed backlog can share a flush with
+    # a live reading
+    latest = {}
+    for row in rows:
+        if row.device_id not in latest or row.timestamp >= latest[row.device_id].timestamp:
+            latest[row.device_id] = row
+    for reading in latest.values():
+        try:
+            publish_tank_state(reading)
+        except Exception as e:
+            print(f"Error publishing tank state: {str(e)}")
+
+
+# Display and alerts follow new data only, never dashboard polling
+def publish_tank_state(reading):
+    previous, state = update_tank_state(reading)
+    if state is previous:
+        # Older than what is already shown
+        return state
+
+    deviceId = device_name(reading.device_id)
+    publish_event("sensor", {key: state[key] for key in TANK_STATE_FIELDS}, device=deviceId)
+    if not tank_state_changed(previous, state):
+        return state
+
+    payload = json.dumps({"eval": state["eval"], "notice": state["toNotice"]})
+    mqtt_client_instance.publish(device_topic(deviceId, "quality"), payload)
+
+    return state
+
+
+INGEST_STATS_KEY = "ingest:stats"
+
+
+def ingest_stats():
+    return {
+        "router": mqtt_client_instance.router.stats(),
+        "sensorBuffer": sensor_buffer.stats(),
+        "statusPublishes": status_publisher.stats(),
+        "updatedAt": time.time(),
+    }
+
+
+# Read by /ingestStats/ from any web worker; expires if ingest stops
+def publish_ingest_stats():
+    stats = ingest_stats()
+    cache.set(INGEST_STATS_KEY, stats, timeout=settings.INGEST_STATS_INTERVAL * 3)
+    return stats
+
+
+sensor_buffer = SensorWriteBuffer(
+    store_sensor_batch,
+    max_size=settings.SENSOR_BUFFER_SIZE,
+    batch_size=settings.SENSOR_BATCH_SIZE,
+    flush_interval=settings.SENSOR_FLUSH_INTERVAL,
+    put_timeout=settings.SENSOR_BUFFER_PUT_TIMEOUT,
+    max_retries=settings.SENSOR_FLUSH_RETRIES,
+    retry_backoff=settings.SENSOR_FLUSH_RETRY_BACKOFF,
+)
@@ -0,0 +1,201 @@
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+from .models import userToken
+
+# Outcome of one token in a multicast, as reported by a backend
+SENT = "sent"
+UNREGISTERED = "unregistered"
+TRANSIENT = "transient"
+FAILED = "failed"
+
+
+class FirebaseBackend:
+    def __init__(self):
+        from firebase_admin import exceptions
+
+        from .firebase_config import messaging
+
+        self.messaging = messaging
+        # The token is gone for good, the app was uninstalled or the token
+        # never belonged to this project. InvalidArgument is a bad message,
+        # not a bad token, and fails like any other error.
+        self.unregistered = (
+            messaging.UnregisteredError,
+            messaging.SenderIdMismatchError,
+        )
+        self.transient = (
+            messaging.QuotaExceededError,
+            exceptions.UnavailableError,
+            exceptions.InternalError,
+            exceptions.DeadlineExceededError,
+        )
+
+    def send_multicast(self, tokens, data):
+        message = self.messaging.MulticastMessage(data=data, tokens=tokens)
+        response = self.messaging.send_each_for_multicast(message)
+
+        outcomes = []
+        for result in response.responses:
+            if result.success:
+                outcomes.append(SENT)
+            elif isinstance(result.exception, self.unregistered):
+                outcomes.append(UNREGISTERED)
+            elif isinstance(result.exception, self.transient):
+                outcomes.append(TRANSIENT)
+            else:
+                print(f"Message failed: {result.exception}")
+                outcomes.append(FAILED)
+        return outcomes
+
+
+class LocMemBackend:
+    # Local stand-in for FCM: keeps every multicast in `outbox` and answers
+    # with the outcome set in `responses` (token -> outcome), SENT otherwise
+    outbox = []
+    responses = {}
+
+    def send_multicast(self, tokens, data):
+        LocMemBackend.outbox.append({"tokens": list(tokens), "data": dict(data)})
+        return [LocMemBackend.responses.get(token, SENT) for token in tokens]
+
+
+class NotificationDispatcher:
+    # Push notifications are queued by the caller and sent by a small pool of
+    # worker threads, so no request or scheduler thread ever waits on FCM.
+    # Tokens go out in multicast batches; tokens FCM no longer knows are
+    # deleted and transient failures are retried with exponential backoff.
+    def __init__(self, backend, workers=2, max_size=100, batch_size=500,
+                 max_retries=3, retry_backoff=1.0):
+        self.backend_path = backend
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.backend = None
+        self.sent = 0
+        self.failed = 0
+        self.pruned = 0
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if self._threads:
+                return
+            if self.backend is None:
+                self.backend = import_string(self.backend_path)()
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"notification-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        # Workers finish what is already queued, then exit on the sentinel
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, title, body, eval):
+        self.start()
+        try:
+            self.queue.put_nowait({"title": title, "body": body, "color": eval})
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print(f"Notification queue full, dropped '{title}' (total dropped: {self.dropped})")
+            return False
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "pruned": self.pruned,
+            "dropped": self.dropped,
+        }
+
+    def dispatch(self, data):
+        tokens = list(userToken.objects.values_list("token", flat=True).distinct())
+        if not tokens:
+            print("No tokens found, notification not sent")
+            return
+
+        for start in range(0, len(tokens), self.batch_size):
+            self._send_batch(tokens[start:start + self.batch_size], data)
+
+    def _send_batch(self, tokens, data):
+        dead = []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                outcomes = self.backend.send_multicast(tokens, data)
+            except Exception as e:
+                # The whole request failed (network, auth), retry all of it
+                print(f"Error sending notification: {str(e)}")
+                outcomes = [TRANSIENT] * len(tokens)
+
+            retry = []
+            for token, outcome in zip(tokens, outcomes):
+                if outcome == SENT:
+                    self.sent += 1
+                elif outcome == UNREGISTERED:
+                    dead.append(token)
+                elif outcome == TRANSIENT:
+                    retry.append(token)
+                else:
+                    self.failed += 1
+            tokens = retry
+            if not tokens:
+                break
+
+        self.failed += len(tokens)
+        if dead:
+            deleted, _ = userToken.objects.filter(token__in=dead).delete()
+            self.pruned += deleted
+            print(f"Removed {deleted} unregistered token(s)")
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                return
+            close_old_connections()
+            try:
+                self.dispatch(data)
+            except Exception as e:
+                print(f"Error sending notification: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+dispatcher = NotificationDispatcher(
+    settings.NOTIFICATION_BACKEND,
+    workers=settings.NOTIFICATION_WORKERS,
+    max_size=settings.NOTIFICATION_QUEUE_SIZE,
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    max_retries=settings.NOTIFICATION_MAX_RETRIES,
+    retry_backoff=settings.NOTIFICATION_RETRY_BACKOFF,
+)
+
+
+def sendPushNotification(title, body, eval):
+    if dispatcher.submit(title, body, eval):
+        return JsonResponse({"status": "success", "message": "Notification queued"})
+    return JsonResponse({"status": "error", "message": "Notification queue is full"})
@@ -0,0 +1,89 @@
+import json
+import struct
+
+import msgpack
+from django.conf import settings
+
+JSON = "json"
+MSGPACK = "msgpack"
+STRUCT = "struct"
+
+READING_FIELDS = ["temp", "ph", "tds", "waterLv"]
+
+# Fixed layout: "FF", version, reading count, then per reading
+# measured_at (uint32 epoch seconds, 0 = unknown) and temp, ph, tds,
+# waterLv as float32, all little-endian. 20 bytes a reading.
+STRUCT_MAGIC = b"FF"
+STRUCT_VERSION = 1
+STRUCT_HEADER = struct.Struct("<2sBB")
+STRUCT_READING = struct.Struct("<I4f")
+
+
+# JSON starts with { or [, the fixed layout with its magic; anything else
+# is taken as MessagePack (a map, or an array of readings)
+def payload_format(payload):
+    if payload[:len(STRUCT_MAGIC)] == STRUCT_MAGIC:
+        return STRUCT
+    if payload.lstrip()[:1] in (b"{", b"["):
+        return JSON
+    return MSGPACK
+
+
+# A reading is a {temp, ph, tds, waterLv, measured_at} map or, to save the
+# keys, a [measured_at, temp, ph, tds, waterLv] array
+def normalize_reading(item):
+    if isinstance(item, (list, tuple)):
+        if len(item) != len(READING_FIELDS) + 1:
+            raise ValueError(f"Invalid reading: {item}")
+        item = dict(zip(["measured_at", *READING_FIELDS], item))
+    if not isinstance(item, dict):
+        raise ValueError("Invalid data format")
+
+    reading = {"measured_at": item.get("measured_at")}
+    for field in READING_FIELDS:
+        value = item.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Invalid {field}: {value}")
+        reading[field] = float(value)
+    return reading
+
+
+def decode_struct(payload):
+    magic, version, count = STRUCT_HEADER.unpack_from(payload)
+    if version != STRUCT_VERSION:
+        raise ValueError(f"Unsupported payload version: {version}")
+    if len(payload) != STRUCT_HEADER.size + count * STRUCT_READING.size:
+        raise ValueError(f"Payload size does not match {count} readings")
+
+    readings = []
+    for values in STRUCT_READING.iter_unpack(payload[STRUCT_HEADER.size:]):
+        measured_at, *metrics = values
+        readings.append([measured_at or None, *metrics])
+    return readings
+
+
+# One MQTT sensor message, in any of the three formats, as a list of
+# readings in the order the device sent them
+def decode_sensor_payload(payload):
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+
+    format = payload_format(payload)
+    if format == STRUCT:
+        items = decode_struct(payload)
+    elif format == JSON:
+        items = json.loads(payload)
+    else:
+        items = msgpack.unpackb(payload)
+
+    # A single reading is a map, a batch is an array of readings
+    if isinstance(items, dict) or (
+        isinstance(items, (list, tuple)) and items and not isinstance(items[0], (dict, list, tuple))
+    ):
+        items = [items]
+    if not isinstance(items, (list, tuple)):
+        raise ValueError("Invalid data format")
+    if len(items) > settings.SENSOR_PAYLOAD_MAX_READINGS:
+        raise ValueError(f"Too many readings in one message: {len(items)}")
+
+    return format, [normalize_reading(item) for item in items]
@@ -0,0 +1,103 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import userPreferences
+
+# ค่าพื้นฐาน default ถ้ายังไม่มีใน DB
+DEFAULT_PREFS = {
+    "minGrnTemp": 25.0,
+    "maxGrnTemp": 27.0,
+    "minOrgTemp": 24.0,
+    "maxOrgTemp": 28.0,
+    "minGrnPh": 7.0,
+    "maxGrnPh": 7.8,
+    "minOrgPh": 6.5,
+    "maxOrgPh": 8.0,
+    "minGrnTds": 150,
+    "maxGrnTds": 450,
+    "minOrgTds": 100,
+    "maxOrgTds": 500,
+    "grnWaterLv": 80,
+    "orgWaterLv": 50,
+    "tankHeight": 100,
+}
+
+PREFS_VERSION_KEY = "preferences:version"
+
+
+class Thresholds:
+    # Immutable snapshot of userPreferences, same attribute names as the model
+    __slots__ = ["version", *DEFAULT_PREFS]
+
+    def __init__(self, version, values):
+        object.__setattr__(self, "version", version)
+        for key in DEFAULT_PREFS:
+            object.__setattr__(self, key, float(values[key]))
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Thresholds are read-only")
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in DEFAULT_PREFS}
+
+
+# Per device: {"thresholds": Thresholds, "checked": monotonic time}
+_local = {}
+_lock = threading.Lock()
+
+
+def prefs_cache_key(device_id):
+    return f"preferences:{device_id}"
+
+
+def next_version():
+    try:
+        return cache.incr(PREFS_VERSION_KEY)
+    except ValueError:
+        # First version, or the cache was flushed
+        cache.add(PREFS_VERSION_KEY, 0, timeout=None)
+        return cache.incr(PREFS_VERSION_KEY)
+
+
+def publish_preferences(preferences):
+    entry = {
+        "version": next_version(),
+        "values": {key: getattr(preferences, key) for key in DEFAULT_PREFS},
+    }
+    cache.set(prefs_cache_key(preferences.device_id), entry, timeout=None)
+    return entry
+
+
+# The next get_thresholds() in any worker reloads and bumps the version
+def invalidate_preferences(device_id):
+    cache.delete(prefs_cache_key(device_id))
+    _local.pop(device_id, None)
+
+
+def load_preferences(device_id):
+    preferences = userPreferences.objects.filter(device_id=device_id).first()
+    if not preferences:
+        preferences = userPreferences.objects.create(device_id=device_id, **DEFAULT_PREFS)
+    return publish_preferences(preferences)
+
+
+# Hot path for every evaluation. Checks the shared cache at most once per
+# PREFS_LOCAL_TTL seconds and only reaches the database on a cache miss.
+def get_thresholds(device_id):
+    local = _local.get(device_id)
+    if local and time.monotonic() - local["checked"] < settings.PREFS_LOCAL_TTL:
+        return local["thresholds"]
+
+    with _lock:
+        entry = cache.get(prefs_cache_key(device_id))
+        if entry is None:
+            entry = load_preferences(device_id)
+
+        thresholds = local["thresholds"] if local else None
+        if thresholds is None or thresholds.version != entry["version"]:
+            thresholds = Thresholds(entry["version"], entry["values"])
+        _local[device_id] = {"thresholds": thresholds, "checked": time.monotonic()}
+        return thresholds
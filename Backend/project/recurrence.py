@@ -0,0 +1,47 @@
+import math
+from datetime import datetime, timedelta
+
+from .models import schedule
+
+ONE_DAY = timedelta(days=1)
+
+
+def schedule_start(task):
+    return datetime.combine(task.workingDate, task.workingTime)
+
+
+# First occurrence at or after `after`, None once a one-off has passed
+def next_occurrence(task, after):
+    start = schedule_start(task)
+    if after <= start:
+        due = start
+    elif task.freq == schedule.Frequency.Today:
+        return None
+    elif task.freq == schedule.Frequency.Hourly:
+        step = timedelta(hours=task.interval)
+        due = start + step * math.ceil((after - start) / step)
+    else:
+        due = datetime.combine(after.date(), task.workingTime)
+        if due < after:
+            due += ONE_DAY
+
+    if task.freq == schedule.Frequency.Weekdays:
+        while due.weekday() >= 5:
+            due += ONE_DAY
+    return due
+
+
+# Occurrences in [start, end), computed on the fly, nothing is stored
+def occurrences(task, start, end):
+    due = next_occurrence(task, start)
+    while due is not None and due < end:
+        yield due
+        due = next_occurrence(task, due + timedelta(microseconds=1))
+
+
+# Next occurrence that has no run logged yet (done, missed or skipped)
+def next_pending(task, after, logged):
+    due = next_occurrence(task, after)
+    while due is not None and due in logged:
+        due = next_occurrence(task, due + timedelta(microseconds=1))
+    return due
@@ -0,0 +1,291 @@
+import base64
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Avg, Count, DateTimeField, Func, Max, Min, Q
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import feedingData, lightData, sensorData, sensorRollup
+from .rollups import EVAL_FIELDS, ROLLUP_METRICS, bucket_start, previous_reading
+
+# Series returned by /report/ and the columns each one exposes
+REPORT_SERIES = {
+    "sensor": (sensorData, ["temp", "ph", "tds", "waterLv", "eval"]),
+    "feeding": (feedingData, ["data"]),
+    "light": (lightData, ["status"]),
+}
+
+
+def parse_report_time(value, end_of_day=False):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    return parsed
+
+
+# The cursor is an opaque token holding the last (recorded_at, id) sent for
+# every series that still has rows left.
+def encode_cursor(positions):
+    # isoformat() keeps the microseconds that DjangoJSONEncoder would drop
+    raw = json.dumps(
+        {name: [recorded_at.isoformat(), pk] for name, (recorded_at, pk) in positions.items()}
+    ).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(token):
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return {
+            name: (parse_datetime(recorded_at), int(pk))
+            for name, (recorded_at, pk) in positions.items()
+            if name in REPORT_SERIES
+        }
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def parse_report_params(params):
+    series = params.get("series")
+    series = series.split(",") if series else list(REPORT_SERIES)
+    for name in series:
+        if name not in REPORT_SERIES:
+            raise ValueError(f"Unknown series: {name}")
+
+    limit = params.get("limit")
+    if limit is not None:
+        limit = int(limit)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+
+    positions = {}
+    if params.get("cursor"):
+        positions = decode_cursor(params["cursor"])
+        # Exhausted series are dropped from the cursor
+        series = [name for name in series if name in positions]
+
+    return {
+        "series": series,
+        "start": parse_report_time(params.get("from")),
+        "end": parse_report_time(params.get("to"), end_of_day=True),
+        "limit": limit,
+        "positions": positions,
+    }
+
+
+def report_rows(name, device_id, start, end, limit, position):
+    model, fields = REPORT_SERIES[name]
+    queryset = model.objects.filter(device_id=device_id)
+    if start:
+        queryset = queryset.filter(recorded_at__gte=start)
+    if end:
+        queryset = queryset.filter(recorded_at__lte=end)
+    if position:
+        recorded_at, pk = position
+        queryset = queryset.filter(
+            Q(recorded_at__gt=recorded_at) | Q(recorded_at=recorded_at, id__gt=pk)
+        )
+
+    queryset = queryset.order_by("recorded_at", "id").values(
+        "id", "recorded_at", "timestamp", *fields
+    )
+    if limit:
+        queryset = queryset[: limit + 1]
+    return queryset.iterator(chunk_size=settings.REPORT_CHUNK_SIZE)
+
+
+def stream_report(series, device_id, start, end, limit, positions):
+    # Yields one JSON document in pieces so memory stays flat however much
+    # history is selected
+    next_positions = {}
+    yield "{"
+    for index, name in enumerate(series):
+        _, fields = REPORT_SERIES[name]
+        yield f'{"," if index else ""}"{name}":['
+
+        sent = 0
+        last = None
+        for row in report_rows(name, device_id, start, end, limit, positions.get(name)):
+            if limit and sent == limit:
+                next_positions[name] = last
+                break
+            item = {
+                "date": row["timestamp"].date(),
+                "time": row["timestamp"].strftime("%H:%M"),
+            }
+            for field in fields:
+                item[field] = row[field]
+            yield ("," if sent else "") + json.dumps(item, cls=DjangoJSONEncoder)
+            sent += 1
+            last = (row["recorded_at"], row["id"])
+        yield "]"
+
+    next_cursor = encode_cursor(next_positions) if next_positions else None
+    yield f',"next":{json.dumps(next_cursor)}}}'
+
+
+class DateBin(Func):
+    # PostgreSQL 14+ date_bin(), for buckets date_trunc can't express
+    function = "date_bin"
+    output_field = DateTimeField()
+
+    def __init__(self, interval, expression):
+        self.interval = interval
+        super().__init__(expression)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        extra_context["template"] = (
+            f"%(function)s(interval '{self.interval}', %(expressions)s, "
+            "TIMESTAMP '2000-01-01')"
+        )
+        return super().as_sql(compiler, connection, **extra_context)
+
+
+REPORT_BUCKETS = {
+    "1m": (timedelta(minutes=1), lambda field: TruncMinute(field)),
+    "15m": (timedelta(minutes=15), lambda field: DateBin("15 minutes", field)),
+    "1h": (timedelta(hours=1), lambda field: TruncHour(field)),
+    "1d": (timedelta(days=1), lambda field: TruncDay(field)),
+}
+METRICS = ["temp", "ph", "tds", "waterLv"]
+
+
+def parse_summary_params(params):
+    bucket = params.get("bucket", "1h")
+    if bucket not in REPORT_BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+
+    end = parse_report_time(params.get("to"), end_of_day=True) or timezone.now()
+    start = parse_report_time(params.get("from")) or end - timedelta(days=1)
+    if start >= end:
+        raise ValueError("from must be before to")
+
+    width, _ = REPORT_BUCKETS[bucket]
+    if (end - start) / width > settings.REPORT_MAX_BUCKETS:
+        raise ValueError(f"Range too large for {bucket} buckets")
+
+    return {"bucket": bucket, "start": start, "end": end}
+
+
+# 1h and 1d buckets are read straight from the maintained rollups
+ROLLUP_BUCKETS = {
+    "1h": sensorRollup.Grain.Hour,
+    "1d": sensorRollup.Grain.Day,
+}
+
+
+def summarize_rollups(grain, device_id, start, end):
+    rollups = sensorRollup.objects.filter(
+        device_id=device_id,
+        grain=grain,
+        bucket__gte=bucket_start(grain, start),
+        bucket__lte=end,
+    ).order_by("bucket")
+
+    series = []
+    for rollup in rollups:
+        item = {
+            "bucket": rollup.bucket,
+            "count": rollup.count,
+            "eval": {
+                state: getattr(rollup, f"{prefix}Count")
+                for state, prefix in EVAL_FIELDS.items()
+            },
+            "minutes": {
+                state: round(getattr(rollup, f"{prefix}Minutes"), 1)
+                for state, prefix in EVAL_FIELDS.items()
+            },
+        }
+        for metric, suffix in ROLLUP_METRICS.items():
+            item[metric] = {
+                "min": getattr(rollup, f"min{suffix}"),
+                "max": getattr(rollup, f"max{suffix}"),
+                "avg": getattr(rollup, f"sum{suffix}") / rollup.count if rollup.count else None,
+                "last": getattr(rollup, f"last{suffix}"),
+            }
+        series.append(item)
+    return series
+
+
+# Minutes per eval for raw buckets, by the rollups' rule: the time between
+# two readings (capped) counts towards the earlier one's eval, in the later
+# one's bucket
+def eval_minutes(device_id, readings, start):
+    previous = previous_reading(device_id, start)
+    last = (previous.recorded_at, previous.eval) if previous else None
+
+    minutes = {}
+    for bucket, recorded_at, eval in (
+        readings.order_by("recorded_at", "id")
+        .values_list("bucket", "recorded_at", "eval")
+        .iterator()
+    ):
+        totals = minutes.setdefault(bucket, {state: 0.0 for state in EVAL_FIELDS})
+        if last:
+            gap = (recorded_at - last[0]).total_seconds() / 60
+            totals[last[1]] += max(0.0, min(gap, settings.ROLLUP_MAX_GAP_MINUTES))
+        last = (recorded_at, eval)
+    return minutes
+
+
+def summarize_sensor_data(bucket, device_id, start, end):
+    if bucket in ROLLUP_BUCKETS:
+        return summarize_rollups(ROLLUP_BUCKETS[bucket], device_id, start, end)
+
+    _, truncate = REPORT_BUCKETS[bucket]
+    readings = sensorData.objects.filter(
+        device_id=device_id, recorded_at__gte=start, recorded_at__lte=end
+    ).annotate(bucket=truncate("recorded_at"))
+
+    aggregates = {
+        "count": Count("id"),
+        "Green": Count("id", filter=Q(eval="Green")),
+        "Orange": Count("id", filter=Q(eval="Orange")),
+        "Red": Count("id", filter=Q(eval="Red")),
+    }
+    for metric in METRICS:
+        aggregates[f"{metric}_min"] = Min(metric)
+        aggregates[f"{metric}_max"] = Max(metric)
+        aggregates[f"{metric}_avg"] = Avg(metric)
+
+    grouped = readings.values("bucket").annotate(**aggregates).order_by("bucket")
+
+    # Last reading of every bucket in one more indexed pass (DISTINCT ON)
+    last_values = {
+        row["bucket"]: row
+        for row in readings.order_by("bucket", "-recorded_at")
+        .distinct("bucket")
+        .values("bucket", *METRICS)
+    }
+    minutes = eval_minutes(device_id, readings, start)
+
+    series = []
+    for row in grouped:
+        last = last_values.get(row["bucket"], {})
+        item = {
+            "bucket": row["bucket"],
+            "count": row["count"],
+            "eval": {state: row[state] for state in ["Green", "Orange", "Red"]},
+            "minutes": {
+                state: round(value, 1)
+                for state, value in minutes.get(row["bucket"], {}).items()
+            },
+        }
+        for metric in METRICS:
+            item[metric] = {
+                "min": row[f"{metric}_min"],
+                "max": row[f"{metric}_max"],
+                "avg": row[f"{metric}_avg"],
+                "last": last.get(metric),
+            }
+        series.append(item)
+    return series
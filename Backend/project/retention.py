@@ -0,0 +1,105 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from .models import feedingData, lightData, sensorData, sensorRollup
+from .rollups import bucket_start, rebuild_rollups
+
+
+def delete_in_chunks(queryset, chunk_size):
+    # Many short DELETEs instead of one long one, so ingest never waits on
+    # a lock held for the whole purge
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by("id").values_list("id", flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(id__in=ids).delete()[0]
+
+
+def archive_day(day, readings, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"sensordata-{day:%Y%m%d}.jsonl.gz")
+    with gzip.open(path, "at") as archive:
+        for row in readings.values(
+            "device_id", "recorded_at", "timestamp", "measured_at", "temp", "ph", "tds", "waterLv", "eval"
+        ).iterator(chunk_size=settings.RETENTION_CHUNK_SIZE):
+            archive.write(json.dumps(row, cls=DjangoJSONEncoder) + "\n")
+
+
+def compact_expired_days(cutoff):
+    # Rebuild a tank's day of rollups from raw before its readings go, unless
+    # the rollups already account for every reading (or a previous run has
+    # already started deleting that day).
+    expired = sensorData.objects.filter(recorded_at__lt=cutoff)
+    compacted = 0
+    for row in (
+        expired.annotate(day=TruncDay("recorded_at"))
+        .values("device_id", "day")
+        .annotate(count=Count("id"))
+        .order_by("day", "device_id")
+    ):
+        day = row["day"]
+        rollup = sensorRollup.objects.filter(
+            device_id=row["device_id"], grain=sensorRollup.Grain.Day, bucket=day
+        ).first()
+        if rollup is None or rollup.count < row["count"]:
+            rebuild_rollups(day, day + timedelta(days=1), device_id=row["device_id"])
+            compacted += row["count"]
+
+        if settings.RETENTION_ARCHIVE_DIR:
+            archive_day(
+                day,
+                expired.filter(
+                    device_id=row["device_id"],
+                    recorded_at__gte=day,
+                    recorded_at__lt=day + timedelta(days=1),
+                ),
+                settings.RETENTION_ARCHIVE_DIR,
+            )
+    return compacted
+
+
+def apply_retention(now=None):
+    now = now or timezone.now()
+    chunk_size = settings.RETENTION_CHUNK_SIZE
+    report = {}
+
+    raw_cutoff = bucket_start(
+        sensorRollup.Grain.Day, now - timedelta(days=settings.RAW_RETENTION_DAYS)
+    )
+    report["compacted"] = compact_expired_days(raw_cutoff)
+    report["sensorData"] = delete_in_chunks(
+        sensorData.objects.filter(recorded_at__lt=raw_cutoff), chunk_size
+    )
+
+    # Hourly rollups age out next, daily rollups are kept as the archive tier
+    hourly_cutoff = now - timedelta(days=settings.ROLLUP_HOURLY_RETENTION_DAYS)
+    report["hourlyRollups"] = delete_in_chunks(
+        sensorRollup.objects.filter(grain=sensorRollup.Grain.Hour, bucket__lt=hourly_cutoff),
+        chunk_size,
+    )
+
+    # Feed / light history, always keeping each tank's latest row (its
+    # current state)
+    event_cutoff = now - timedelta(days=settings.EVENT_RETENTION_DAYS)
+    for model in [feedingData, lightData]:
+        latest = list(
+            model.objects.order_by("device_id", "-recorded_at")
+            .distinct("device_id")
+            .values_list("id", flat=True)
+        )
+        report[model.__name__] = delete_in_chunks(
+            model.objects.filter(recorded_at__lt=event_cutoff).exclude(id__in=latest),
+            chunk_size,
+        )
+
+    print(f"Retention run: {report}")
+    return report
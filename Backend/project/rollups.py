@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import device, sensorData, sensorRollup
+
+ROLLUP_METRICS = {
+    "temp": "Temp",
+    "ph": "Ph",
+    "tds": "Tds",
+    "waterLv": "WaterLv",
+}
+EVAL_FIELDS = {
+    "Green": "green",
+    "Orange": "orange",
+    "Red": "red",
+}
+
+
+def bucket_start(grain, value):
+    if grain == sensorRollup.Grain.Hour:
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupAccumulator:
+    # Folds one device's readings (in recorded_at order) into per-bucket
+    # deltas. The time between two readings is counted towards the earlier
+    # reading's eval.
+    def __init__(self, device_id, previous=None):
+        self.device_id = device_id
+        self.previous = previous
+        self.buckets = OrderedDict()
+
+    def _bucket(self, grain, bucket):
+        key = (grain, bucket)
+        if key not in self.buckets:
+            self.buckets[key] = {"count": 0, "lastRecordedAt": None}
+            for suffix in ROLLUP_METRICS.values():
+                self.buckets[key].update({
+                    f"sum{suffix}": 0.0, f"min{suffix}": None,
+                    f"max{suffix}": None, f"last{suffix}": None,
+                })
+            for prefix in EVAL_FIELDS.values():
+                self.buckets[key].update({f"{prefix}Count": 0, f"{prefix}Minutes": 0.0})
+        return self.buckets[key]
+
+    def add(self, reading):
+        minutes = 0.0
+        if self.previous is not None:
+            gap = (reading.recorded_at - self.previous.recorded_at).total_seconds() / 60
+            minutes = max(0.0, min(gap, settings.ROLLUP_MAX_GAP_MINUTES))
+
+        for grain in sensorRollup.Grain.values:
+            delta = self._bucket(grain, bucket_start(grain, reading.recorded_at))
+            delta["count"] += 1
+            delta["lastRecordedAt"] = reading.recorded_at
+            for metric, suffix in ROLLUP_METRICS.items():
+                value = getattr(reading, metric)
+                delta[f"sum{suffix}"] += value
+                delta[f"min{suffix}"] = value if delta[f"min{suffix}"] is None else min(delta[f"min{suffix}"], value)
+                delta[f"max{suffix}"] = value if delta[f"max{suffix}"] is None else max(delta[f"max{suffix}"], value)
+                delta[f"last{suffix}"] = value
+            delta[f"{EVAL_FIELDS[reading.eval]}Count"] += 1
+            if self.previous is not None:
+                delta[f"{EVAL_FIELDS[self.previous.eval]}Minutes"] += minutes
+
+        self.previous = reading
+
+    def rows(self):
+        return [
+            sensorRollup(device_id=self.device_id, grain=grain, bucket=bucket, **delta)
+            for (grain, bucket), delta in self.buckets.items()
+        ]
+
+
+def merge_rollup(rollup, delta):
+    rollup.count += delta["count"]
+    for suffix in ROLLUP_METRICS.values():
+        setattr(rollup, f"sum{suffix}", getattr(rollup, f"sum{suffix}") + delta[f"sum{suffix}"])
+        for bound, pick in [("min", min), ("max", max)]:
+            current = getattr(rollup, f"{bound}{suffix}")
+            value = delta[f"{bound}{suffix}"]
+            setattr(rollup, f"{bound}{suffix}", value if current is None else pick(current, value))
+    for prefix in EVAL_FIELDS.values():
+        setattr(rollup, f"{prefix}Count", getattr(rollup, f"{prefix}Count") + delta[f"{prefix}Count"])
+        setattr(rollup, f"{prefix}Minutes", getattr(rollup, f"{prefix}Minutes") + delta[f"{prefix}Minutes"])
+
+    # Readings can arrive out of order, only move "last" forward
+    if rollup.lastRecordedAt is None or delta["lastRecordedAt"] >= rollup.lastRecordedAt:
+        rollup.lastRecordedAt = delta["lastRecordedAt"]
+        for suffix in ROLLUP_METRICS.values():
+            setattr(rollup, f"last{suffix}", delta[f"last{suffix}"])
+
+
+def previous_reading(device_id, before):
+    return (
+        sensorData.objects.filter(device_id=device_id, recorded_at__lt=before)
+        .order_by("-recorded_at")
+        .first()
+    )
+
+
+# update_rollups (ingest) and rebuild_rollups (scheduler, manage.py) both
+# rewrite a device's buckets, so both hold its device row while they do.
+# NO KEY UPDATE still lets readings referencing the device be inserted.
+def lock_devices(device_ids=None):
+    devices = device.objects.select_for_update(no_key=True).order_by("pk")
+    if device_ids is not None:
+        devices = devices.filter(pk__in=device_ids)
+    list(devices.values_list("pk", flat=True))
+
+
+# Called by the ingest path right after new readings are stored
+def update_rollups(readings):
+    if not readings:
+        return
+    by_device = {}
+    for reading in sorted(readings, key=lambda reading: reading.recorded_at):
+        by_device.setdefault(reading.device_id, []).append(reading)
+
+    accumulators = []
+    for device_id, device_readings in by_device.items():
+        accumulator = RollupAccumulator(
+            device_id, previous_reading(device_id, device_readings[0].recorded_at)
+        )
+        for reading in device_readings:
+            accumulator.add(reading)
+        accumulators.append(accumulator)
+
+    # A batch touches one or two buckets per grain and device, lock and
+    # merge each
+    with transaction.atomic():
+        lock_devices(sorted(by_device))
+        for accumulator in accumulators:
+            for (grain, bucket), delta in accumulator.buckets.items():
+                rollup, _ = sensorRollup.objects.select_for_update().get_or_create(
+                    device_id=accumulator.device_id, grain=grain, bucket=bucket
+                )
+                merge_rollup(rollup, delta)
+                rollup.save()
+
+
+# Recompute rollups from raw history, for one device or all of them and
+# optionally for [start, end) only. Both bounds are widened to whole days
+# so no bucket is left half-built, and days retention has already purged
+# are never touched: their rollups are the only record left.
+def rebuild_rollups(start=None, end=None, device_id=None, chunk_size=5000):
+    with transaction.atomic():
+        lock_devices([device_id] if device_id else None)
+        return build_rollups(start, end, device_id, chunk_size)
+
+
+# First day of a device's history that can be rebuilt from raw: the day of
+# its oldest remaining reading, or the day after if retention has already
+# deleted part of that day (its rollup counts more readings than are left)
+def raw_history_start(device_id):
+    oldest = (
+        sensorData.objects.filter(device_id=device_id)
+        .order_by("recorded_at")
+        .values_list("recorded_at", flat=True)
+        .first()
+    )
+    if oldest is None:
+        return None
+    day = bucket_start(sensorRollup.Grain.Day, oldest)
+    next_day = day + timedelta(days=1)
+    rollup = sensorRollup.objects.filter(
+        device_id=device_id, grain=sensorRollup.Grain.Day, bucket=day
+    ).first()
+    if rollup and rollup.count > sensorData.objects.filter(
+        device_id=device_id, recorded_at__gte=day, recorded_at__lt=next_day
+    ).count():
+        return next_day
+    return day
+
+
+def build_rollups(start, end, device_id, chunk_size):
+    if start:
+        start = bucket_start(sensorRollup.Grain.Day, start)
+    if end:
+        end = bucket_start(sensorRollup.Grain.Day, end)
+    device_ids = [device_id] if device_id else device.objects.order_by("pk").values_list("pk", flat=True)
+
+    count = 0
+    for device_id in device_ids:
+        first_day = raw_history_start(device_id)
+        if first_day is None:
+            continue
+        device_start = max(start, first_day) if start else first_day
+        if end and device_start >= end:
+            continue
+
+        readings = sensorData.objects.filter(
+            device_id=device_id, recorded_at__gte=device_start
+        ).order_by("recorded_at", "id")
+        rollups = sensorRollup.objects.filter(device_id=device_id, bucket__gte=device_start)
+        if end:
+            readings = readings.filter(recorded_at__lt=end)
+            rollups = rollups.filter(bucket__lt=end)
+
+        accumulator = RollupAccumulator(device_id, previous_reading(device_id, device_start))
+        for reading in readings.iterator(chunk_size=chunk_size):
+            accumulator.add(reading)
+        rows = accumulator.rows()
+
+        rollups.delete()
+        sensorRollup.objects.bulk_create(rows, batch_size=1000)
+        count += len(rows)
+    return count
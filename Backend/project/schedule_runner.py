@@ -0,0 +1,168 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.db import close_old_connections
+
+# Heap entries are (when, kind, schedule id, due). Reminders sort before the
+# run they announce when both fall on the same instant.
+REMIND = 0
+RUN = 1
+
+
+class ScheduleRunner:
+    # Keeps the upcoming occurrences in a min-heap and sleeps until the
+    # earliest one, instead of polling the database every minute. Changes
+    # arrive through add()/discard(); a full resync only runs every
+    # resync_interval as a safety net.
+    def __init__(self, load, run, remind=None, miss=None, grace=300, reminder=180,
+                 resync_interval=3600, workers=2):
+        self.load = load
+        self.run = run
+        self.remind = remind
+        self.miss = miss
+        self.grace = timedelta(seconds=grace)
+        self.reminder = timedelta(seconds=reminder)
+        self.resync_interval = timedelta(seconds=resync_interval)
+        self.workers = workers
+
+        self.heap = []
+        self.due = {}
+        self.done = {}
+        self.resync_at = datetime.now()
+        self.condition = threading.Condition()
+        self.executor = None
+
+        self.fired = 0
+        self.missed = 0
+
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        # Started again after a stop (e.g. re-elected): reload everything
+        self.resync_at = datetime.now()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="schedule")
+        self._thread = threading.Thread(target=self._run, name="schedule-runner", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        with self.condition:
+            self._stopping = True
+            self.condition.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        if self.executor:
+            self.executor.shutdown(wait=False)
+
+    def add(self, schedule_id, due):
+        with self.condition:
+            self._push(schedule_id, due)
+            self.condition.notify()
+
+    def discard(self, schedule_id):
+        with self.condition:
+            # Heap entries of a discarded schedule are skipped when popped
+            self.due.pop(schedule_id, None)
+            self.condition.notify()
+
+    def resync(self):
+        close_old_connections()
+        entries = self.load()
+        with self.condition:
+            self.heap = []
+            self.due = {}
+            expired = datetime.now() - self.grace
+            self.done = {key: due for key, due in self.done.items() if due >= expired}
+            for schedule_id, due in entries:
+                self._push(schedule_id, due)
+            self.resync_at = datetime.now() + self.resync_interval
+            self.condition.notify()
+        print(f"Scheduler loaded {len(entries)} upcoming schedule(s)")
+
+    def stats(self):
+        with self.condition:
+            upcoming = min(self.due.values(), default=None)
+            return {
+                "pending": len(self.due),
+                "next": upcoming.isoformat() if upcoming else None,
+                "fired": self.fired,
+                "missed": self.missed,
+            }
+
+    def _push(self, schedule_id, due):
+        # The row may still read Pending while its run is in progress
+        if self.done.get(schedule_id) == due:
+            return
+        self.due[schedule_id] = due
+        heapq.heappush(self.heap, (due, RUN, schedule_id, due))
+        # Only announce runs that are still far enough away
+        if self.remind and due - self.reminder > datetime.now():
+            heapq.heappush(self.heap, (due - self.reminder, REMIND, schedule_id, due))
+
+    def _next(self):
+        # Blocks until an entry is due or a resync is needed, returns
+        # (None, None) once stopped
+        with self.condition:
+            while not self._stopping:
+                while self.heap and self.due.get(self.heap[0][2]) != self.heap[0][3]:
+                    heapq.heappop(self.heap)
+
+                now = datetime.now()
+                if now >= self.resync_at:
+                    return "resync", now
+                if self.heap and self.heap[0][0] <= now:
+                    entry = heapq.heappop(self.heap)
+                    if entry[1] == RUN:
+                        # One run per occurrence, the next one is re-added
+                        # when the row changes
+                        self.due.pop(entry[2], None)
+                        self.done[entry[2]] = entry[3]
+                    return entry, now
+
+                wake = self.resync_at
+                if self.heap:
+                    wake = min(wake, self.heap[0][0])
+                self.condition.wait((wake - now).total_seconds())
+            return None, None
+
+    def _run(self):
+        while True:
+            entry, now = self._next()
+            if entry is None:
+                return
+            if entry == "resync":
+                try:
+                    self.resync()
+                except Exception as e:
+                    print(f"Scheduler resync failed: {str(e)}")
+                    self.resync_at = datetime.now() + timedelta(seconds=30)
+                continue
+
+            when, kind, schedule_id, due = entry
+            if kind == REMIND:
+                self.executor.submit(self._fire, self.remind, schedule_id, due)
+                continue
+
+            if now - when > self.grace:
+                self.missed += 1
+                print(f"Schedule {schedule_id} missed its {due} run by {now - when}")
+                if self.miss:
+                    self.executor.submit(self._fire, self.miss, schedule_id, due)
+                continue
+
+            self.fired += 1
+            self.executor.submit(self._fire, self.run, schedule_id, due)
+
+    def _fire(self, callback, schedule_id, due):
+        close_old_connections()
+        try:
+            callback(schedule_id, due)
+        except Exception as e:
+            print(f"Error running schedule {schedule_id}: {str(e)}")
+        finally:
+            close_old_connections()
@@ -2,191 +2,234 @@ from datetime import timedelta, datetime, timezone
 from .models import *
 import logging
 from .views import *
+from .devices import device_pk
+from .events import add_listener
+from .leader import LeaderLease
+from .recurrence import next_pending
+from .rollups import rebuild_rollups
+from .schedule_runner import ScheduleRunner
+from apscheduler.schedulers.background import BackgroundScheduler
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+from django_apscheduler.jobstores import DjangoJobStore
+from django_apscheduler.models import DjangoJob
 
 logging.basicConfig(level=logging.DEBUG)
 
 
-def get_schedules():
-    today = datetime.today().date()  # Get today's date
-    schedules = schedule.objects.filter(workingDate=today, status='Pending')
+def feed(task):
+    title = "Task Triggering Alert"
+    body = f"Performing schedule: {task.desc}!"
+    sendPushNotification(title, body, 'info')
+    result = feed_instant(task.device_id)
+    print(result)
+
+    print("Feed success, data saved.")
+    return result
 
-    print("Retrieved schedules for today:", schedules)
-    return schedules
 
+def light(task):
+    title = "Task Triggering Alert"
+    body = f"Performing schedule: {task.desc}!"
+    sendPushNotification(title, body, 'info')
+    
+    print(f'-------- {task.freq}, {task.id}, {task.desc}')
+    
+    latest_light = lightData.objects.filter(device_id=task.device_id).order_by("recorded_at").last()
+    color = latest_light.color
+    switch = "ON" if "ON" in task.desc else "OFF"
+    result = light_instant(task.device_id, switch, color)
 
-def update_task_status(schedule_id):
-    current_schedule = schedule.objects.get(id=schedule_id)
-    current_schedule.status = "Success"
-    current_schedule.save()
+    # Log the event
+    timestamp = timezone.now()
+    lightData.objects.create(device_id=task.device_id, timestamp=timestamp, status=switch, color=color)
+    print(result)
+    return result
+
+
+def earliest_due():
+    return datetime.now() - timedelta(seconds=settings.SCHEDULE_MISFIRE_GRACE)
+
+
+def next_due(task, after):
+    logged = set(task.runs.filter(dueAt__gte=after).values_list("dueAt", flat=True))
+    return next_pending(task, after, logged)
+
+
+# Next unlogged occurrence of every active schedule, two queries in total
+def load_due_schedules():
+    earliest = earliest_due()
+    logged = {}
+    for schedule_id, due in scheduleRun.objects.filter(dueAt__gte=earliest).values_list(
+        "schedule_id", "dueAt"
+    ):
+        logged.setdefault(schedule_id, set()).add(due)
+
+    entries = []
+    for task in schedule.objects.filter(status="Pending"):
+        due = next_pending(task, earliest, logged.get(task.id, set()))
+        if due:
+            entries.append((task.id, due))
+    return entries
+
+
+# The row lock keeps two runners off the same schedule at once, and the
+# unique (schedule, dueAt) run row means an occurrence is claimed only once
+def claim_run(schedule_id, due, status):
+    with transaction.atomic():
+        task = (
+            schedule.objects.select_for_update(skip_locked=True)
+            .filter(id=schedule_id, status=schedule.Status.Pending)
+            .first()
+        )
+        if task is None:
+            return None, None
+        run, created = scheduleRun.objects.get_or_create(
+            schedule=task, dueAt=due, defaults={"status": status}
+        )
+    if not created:
+        return None, None
+    return task, run
+
+
+def finish_run(task, due):
+    if task.freq == schedule.Frequency.Today:
+        task.status = schedule.Status.Success
+        task.save(update_fields=["status"])
+    else:
+        upcoming = next_due(task, due + timedelta(microseconds=1))
+        if upcoming:
+            schedule_runner.add(task.id, upcoming)
 
-    print(f"Updated status of schedule {schedule_id} to 'Success'")
 
+def run_schedule(schedule_id, due):
+    task, run = claim_run(schedule_id, due, scheduleRun.Status.Running)
+    if task is None:
+        # Cancelled, already run or being run by another process
+        return
 
-def updated_everyday_task(schedule_id):
+    print(f"Triggering task: {task.desc} due {due}")
     try:
-        current_schedule = schedule.objects.get(id=schedule_id)
+        if "Feed" in task.desc:
+            result = feed(task)
+        else:
+            result = light(task)
+    except Exception as e:
+        result = {"error": str(e)}
 
-        today = current_schedule.workingDate
+    if "error" in result:
+        run.status = scheduleRun.Status.Failed
+        run.result = result["error"][:255]
+    else:
+        run.status = scheduleRun.Status.Success
+        run.result = result["message"][:255]
+    run.save(update_fields=["status", "result"])
 
-        if isinstance(today, str):
-            today = datetime.strptime(today, "%Y-%m-%d").date()
+    finish_run(task, due)
 
-        next_day = today + timedelta(days=1)
-        current_schedule.workingDate = next_day
-        current_schedule.save()
 
-        print(f"Updated schedule {schedule_id} to next day: {next_day}")
-    except Exception as e:
-        print(f"Error updating schedule {schedule_id}: {e}")
+def miss_schedule(schedule_id, due):
+    task, _ = claim_run(schedule_id, due, scheduleRun.Status.Missed)
+    if task:
+        finish_run(task, due)
 
-def everyday_task_reset():
-    today = datetime.today().date()
-    tomorrow_schedules = schedule.objects.filter(workingDate=today, status='Success')
 
-    for tomorrow in tomorrow_schedules:
-        tomorrow.status = 'Pending'
-        tomorrow.save()
+def remind_schedule(schedule_id, due):
+    task = schedule.objects.filter(id=schedule_id, status="Pending").first()
+    if task:
+        title = "Task Triggering Alert"
+        body = f"Task: {task.desc} will be triggered in {settings.SCHEDULE_REMINDER_MINUTES} minutes!"
+        sendPushNotification(title, body, 'info')
 
-    print(f"Updated status of tomorrow's schedule(s) to 'Pending'")
 
-def feed(freq, schedule_id, schedule_desc):
-    title = "Task Triggering Alert"
-    body = f"Performing schedule: {schedule_desc}!"
-    sendPushNotification(title, body, 'info')
-    result = feed_instant()
-    print(result)
+schedule_runner = ScheduleRunner(
+    load_due_schedules,
+    run_schedule,
+    remind=remind_schedule,
+    miss=miss_schedule,
+    grace=settings.SCHEDULE_MISFIRE_GRACE,
+    reminder=settings.SCHEDULE_REMINDER_MINUTES * 60,
+    resync_interval=settings.SCHEDULE_RESYNC_INTERVAL,
+)
+
+
+# Schedule rows saved or deleted by any process reach the runner as events
+def schedule_event(event, data):
+    if event != "schedule":
+        return
+    if data["deleted"] or data["status"] != "Pending":
+        schedule_runner.discard(data["id"])
+        return
 
-    if freq == "Everyday":
-        print(f"Performing feed for Everyday!")
-        updated_everyday_task(schedule_id)
+    close_old_connections()
+    task = schedule.objects.filter(id=data["id"], status="Pending").first()
+    due = next_due(task, earliest_due()) if task else None
+    if due:
+        schedule_runner.add(task.id, due)
     else:
-        print(f"Performing feed for Today!")
+        schedule_runner.discard(data["id"])
 
-    print("Feed success, data saved.")
 
+_jobs = {"scheduler": None}
 
-def light(freq, switch, schedule_id, schedule_desc):
-    title = "Task Triggering Alert"
-    body = f"Performing schedule: {schedule_desc}!"
-    sendPushNotification(title, body, 'info')
-    
-    print(f'-------- {freq}, {switch}, {schedule_id}, {schedule_desc}')
-    
-    latest_light = lightData.objects.last()
-    color = latest_light.color
-    if "ON" in switch:
-        result = light_instant("ON", color)
-        
-        # Log the event
-        timestamp = timezone.now()
-        lightData.objects.create(timestamp=timestamp, status="ON", color=color)
-        print(result)
-        
-        if freq == "Everyday":
-            updated_everyday_task(schedule_id)
-        else:
-            print(f"Performing light ON for Today!")
 
-    else:
-        result = light_instant("OFF", color)
-        
-        # Log the event
-        timestamp = timezone.now()
-        lightData.objects.create(timestamp=timestamp, status="OFF", color=color)
-        print(result)
-        
-        if freq == "Everyday":
-            updated_everyday_task(schedule_id)
-        else:
-            print(f"Performing light OFF for Today!")
+# New thresholds re-grade history in the request, the rollups built from it
+# are rebuilt here by the leader, as a one-off persisted job
+def rollups_event(event, data):
+    jobs = _jobs["scheduler"]
+    if event != "rollups" or jobs is None:
+        return
+    close_old_connections()
+    jobs.add_job(
+        rebuild_rollups,
+        kwargs={"start": parse_datetime(data["since"]), "device_id": device_pk(data["device"])},
+    )
 
 
-# Function to check if it's time to trigger any task
-def check_and_trigger_task():
-    current_time = datetime.now().strftime("%H:%M")  # Format current time as HH:MM
-    print(f"Current time: {current_time}")
+# Periodic jobs, persisted in the database so a new leader picks up
+# where the previous one left off
+def start_jobs():
+    from .retention import apply_retention
 
-    print(f"Checking schedules at {current_time}")
+    jobs = BackgroundScheduler(
+        jobstores={"default": DjangoJobStore()},
+        job_defaults={"coalesce": True, "misfire_grace_time": settings.SCHEDULE_MISFIRE_GRACE},
+    )
+    # Water-quality alerts are raised at ingest now, drop the old polling job
+    DjangoJob.objects.filter(id="check_and_trigger_notification").delete()
+    jobs.add_job(
+        apply_retention, 'cron', hour='03', minute='30',
+        id="apply_retention", replace_existing=True,
+    )
+    jobs.start()
+    _jobs["scheduler"] = jobs
 
-    schedules = get_schedules()
-    print(f"Schedules fetched: {schedules}")
 
-    if not schedules:
-        print("No schedules for today.")
-        return
+def become_leader():
+    schedule_runner.start()
+    start_jobs()
 
-    for schedule in schedules:
-        working_time = schedule.workingTime.strftime(
-            "%H:%M"
-        )  # Format schedule time as HH:MM
-        task_desc = schedule.desc
-        task_freq = schedule.freq
-        task_id = schedule.id
-        
-
-        print(f"Comparing {working_time} with {current_time}")
-
-        if current_time == working_time:
-            print(f"Triggering task: {task_desc} at {current_time}")
-
-            if "Feed" in task_desc:
-                feed(task_freq, task_id, task_desc)
-            else:
-                light(task_freq, task_desc, task_id, task_desc)
-                
-            update_task_status(task_id)
-
-# Check latest data's evaluate in every 15 mins, if Ref or Orange, send push notification 
-# in case app is on background or not open
-def check_and_trigger_notification():
-    latest_data = sensorData.objects.latest("timestamp")
-    toNotice = sensorEval('getToNotice', latest_data)
-    
-    display_quality(latest_data, toNotice)
-    
-    if latest_data.eval in ["Orange", "Red"]:
-        title = "Water Quality Alert"
-
-        if latest_data.eval == "Orange":
-            body = "Water quality needs attention!"
-        elif latest_data.eval == "Red":
-            body = "Critical water quality evaluate detected!"
-                    
-        sendPushNotification(title, body, latest_data.eval)
-            
-    else:
-        print(f'Water Quality at {latest_data.timestamp} is {latest_data.eval}')
-        
-# Check schedule's workingTime, if now()-workingTime = 3 mins, send push noti to user
-def check_and_noti_task():
-    current_time = datetime.now()  # Format current time as HH:MM
-    print(f"Current time: {current_time.strftime('%H:%M')}")
-
-    schedules = get_schedules()
-    print(f"Schedules fetched: {schedules}")
-
-    if not schedules:
-        print("No schedules for today.")
-        return
 
-    for schedule in schedules:
-        if isinstance(schedule.workingTime, str):
-            working_time = datetime.strptime(schedule.workingTime, "%H:%M")
-        else:
-            working_time = schedule.workingTime
-
-        # Align working_time with today's date if it's only a time
-        working_time = current_time.replace(hour=working_time.hour, minute=working_time.minute, second=0, microsecond=0)
-
-        # Calculate the time difference
-        time_difference = (working_time - current_time).total_seconds() / 60
-        
-        if 2.5 < time_difference < 3.5:
-            print(f"Task: {schedule.desc} will be triggered in 3 minutes!")
-            
-            title = "Task Triggering Alert"
-            body =  f"Task: {schedule.desc} will be triggered in 3 minutes!"
-            sendPushNotification(title, body, 'info')
-           
-        elif 0 < time_difference <= 10:
-            print(f"{time_difference:.0f} minutes left until next task!")
\ No newline at end of file
+def step_down():
+    schedule_runner.stop()
+    if _jobs["scheduler"]:
+        _jobs["scheduler"].shutdown(wait=False)
+        _jobs["scheduler"] = None
+
+
+scheduler_lease = LeaderLease(
+    "scheduler", become_leader, step_down, ttl=settings.SCHEDULER_LEASE_SECONDS
+)
+
+
+# Safe to call in every replica, only the lease holder runs anything
+def start_scheduler():
+    add_listener(schedule_event)
+    add_listener(rollups_event)
+    scheduler_lease.start()
+
+
+def stop_scheduler():
+    scheduler_lease.stop()
+
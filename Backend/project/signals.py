@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .device_state import record_feed, record_light
+from .devices import device_name
+from .events import publish_event
+from .models import feedingData, lightData, schedule, userPreferences
+from .preferences import invalidate_preferences
+
+
+@receiver(post_save, sender=userPreferences)
+@receiver(post_delete, sender=userPreferences)
+def preferences_changed(sender, instance, **kwargs):
+    invalidate_preferences(instance.device_id)
+
+
+# Dashboards re-read the schedule list when any schedule changes
+@receiver(post_save, sender=schedule)
+@receiver(post_delete, sender=schedule)
+def schedule_changed(sender, instance, **kwargs):
+    publish_event(
+        "schedule",
+        {
+            "id": instance.id,
+            "status": instance.status,
+            "deleted": kwargs["signal"] is post_delete,
+        },
+        device=device_name(instance.device_id),
+    )
+
+
+@receiver(post_save, sender=feedingData)
+def feed_saved(sender, instance, created, **kwargs):
+    if created:
+        record_feed(instance)
+
+
+@receiver(post_save, sender=lightData)
+def light_saved(sender, instance, created, **kwargs):
+    if created:
+        record_light(instance)
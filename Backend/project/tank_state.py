@@ -0,0 +1,58 @@
+from django.core.cache import cache
+
+from .evaluation import get_rules
+from .models import sensorData
+
+# Fields returned by GET /sensorDataDisplay/, the rest is cache metadata
+TANK_STATE_FIELDS = ["temp", "ph", "tds", "waterLv", "timestamp", "eval", "toNotice"]
+
+
+def tank_state_key(device_id):
+    return f"tank:{device_id}"
+
+
+def build_tank_state(reading):
+    rules = get_rules(reading.device_id)
+    eval, notices = rules.evaluate(reading.temp, reading.ph, reading.tds, reading.waterLv)
+    return {
+        "temp": round(reading.temp, 1),
+        "ph": round(reading.ph, 1),
+        "tds": round(reading.tds, 1),
+        "waterLv": reading.waterLv,
+        "timestamp": reading.timestamp.timestamp(),
+        "eval": eval,
+        "toNotice": notices,
+        "recordedAt": reading.recorded_at.timestamp(),
+        # A new reading or new thresholds both change what the dashboard shows
+        "etag": f'"{reading.pk}-{rules.version}"',
+    }
+
+
+# Snapshot of a tank's latest reading. Only a cache miss reaches the database.
+def get_tank_state(device_id):
+    state = cache.get(tank_state_key(device_id))
+    if state is None:
+        reading = sensorData.objects.filter(device_id=device_id).order_by("recorded_at", "id").last()
+        if reading is None:
+            return None
+        state = build_tank_state(reading)
+        cache.set(tank_state_key(device_id), state, timeout=None)
+    return state
+
+
+# Called on new data. Returns (previous, current) so callers can act on changes.
+def update_tank_state(reading):
+    key = tank_state_key(reading.device_id)
+    previous = cache.get(key)
+    if previous and previous["recordedAt"] > reading.recorded_at.timestamp():
+        return previous, previous
+
+    state = build_tank_state(reading)
+    cache.set(key, state, timeout=None)
+    return previous, state
+
+
+def tank_state_changed(previous, state):
+    if previous is None:
+        return True
+    return previous["eval"] != state["eval"] or previous["toNotice"] != state["toNotice"]
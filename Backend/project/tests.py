@@ -0,0 +1,611 @@
+import importlib
+import json
+import struct
+import sys
+import threading
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import msgpack
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.functions import Now
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from firebase_admin import exceptions, messaging
+
+from . import devices
+from .alerts import evaluate_alerts
+from .device_commands import DeviceBusy, DeviceCommandRPC
+from .device_state import get_device_state, record_feed, record_light
+from .leader import LeaderLease
+from .models import (
+    feedingData,
+    leaderLease,
+    lightData,
+    schedule,
+    scheduleRun,
+    sensorData,
+    sensorRollup,
+    userToken,
+)
+from .mqtt_client import mqtt_client_instance, process_sensor_readings, sensor_buffer, store_sensor_batch
+from .notifications import (
+    FAILED,
+    SENT,
+    TRANSIENT,
+    UNREGISTERED,
+    FirebaseBackend,
+    LocMemBackend,
+    NotificationDispatcher,
+)
+from .payloads import STRUCT_HEADER, STRUCT_READING, decode_sensor_payload
+from .recurrence import next_pending, occurrences
+from .retention import apply_retention
+from .rollups import rebuild_rollups, update_rollups
+from .scheduler import claim_run, run_schedule
+from .topic_router import POOL, TopicRouter
+
+GREEN = {"temp": 26.0, "ph": 7.4, "tds": 300.0, "waterLv": 80.0}
+
+
+def reset_state():
+    cache.clear()
+    devices._ids["by_id"].clear()
+    devices._ids["by_pk"].clear()
+
+
+class RecordingMQTT:
+    def __init__(self):
+        self.published = []
+
+    def connect(self):
+        pass
+
+    def subscribe(self, topic):
+        pass
+
+    def publish(self, topic, message):
+        self.published.append((topic, message))
+        return True
+
+
+class DeviceCommandRPCTests(SimpleTestCase):
+    def setUp(self):
+        self.mqtt = RecordingMQTT()
+        self.rpc = DeviceCommandRPC(
+            self.mqtt, lambda device: f"{device}/command", [], timeout=1, max_in_flight=2
+        )
+
+    def request_id(self, index):
+        return self.mqtt.published[index][1].split("#")[1]
+
+    def test_reply_resolves_its_request(self):
+        first = self.rpc.send("Feed", "tank1")
+        second = self.rpc.send("Light", "tank1")
+
+        self.assertTrue(self.rpc.resolve(f"Light done#{self.request_id(1)}", "tank1"))
+        self.assertEqual(second.result(0), "Light done")
+        self.assertFalse(first.done())
+
+    def test_reply_from_another_device_is_ignored(self):
+        future = self.rpc.send("Feed", "tank1")
+
+        self.assertFalse(self.rpc.resolve(f"Feed done#{self.request_id(0)}", "tank2"))
+        self.assertFalse(future.done())
+
+    def test_uncorrelated_reply_resolves_oldest_request_of_its_device(self):
+        other = self.rpc.send("Feed", "tank1")
+        mine = self.rpc.send("Feed", "default")
+
+        self.assertTrue(self.rpc.resolve("Feed Successful!"))
+        self.assertEqual(mine.result(0), "Feed Successful!")
+        self.assertFalse(other.done())
+
+    def test_busy_device_is_refused(self):
+        self.rpc.send("Feed", "tank1")
+        self.rpc.send("Feed", "tank1")
+        with self.assertRaises(DeviceBusy):
+            self.rpc.send("Feed", "tank1")
+        # Other tanks have their own slots
+        self.rpc.send("Feed", "tank2")
+
+
+@mock.patch("project.alerts.sendPushNotification")
+class AlertTests(TestCase):
+    def setUp(self):
+        reset_state()
+        self.device_id = devices.device_pk("alerts", create=True)
+
+    def reading(self, temp):
+        message = evaluate_alerts(self.device_id, temp, GREEN["ph"], GREEN["tds"], GREEN["waterLv"])
+        return message and message[2]
+
+    def test_hysteresis(self, push):
+        # Green up to 27, back to Green only below 27 - 0.5
+        levels = [self.reading(temp) for temp in [27.2, 26.8, 27.2, 26.4, 26.8]]
+        self.assertEqual(levels, ["Orange", None, None, "Green", None])
+        self.assertEqual(push.call_count, 2)
+
+    def test_repeated_readings_alert_once(self, push):
+        levels = [self.reading(temp) for temp in [29.0, 29.0, 27.8, 29.0]]
+        self.assertEqual(levels, ["Red", None, None, None])
+
+    @override_settings(ALERT_RATE_LIMIT=1)
+    def test_suppressed_escalation_is_pushed_later(self, push):
+        self.assertEqual(self.reading(27.5), "Orange")
+        self.assertIsNone(self.reading(29.0))
+        self.assertIsNone(self.reading(29.0))
+
+        with override_settings(ALERT_RATE_LIMIT=2):
+            self.assertEqual(self.reading(29.0), "Red")
+        self.assertEqual([call.args[2] for call in push.call_args_list], ["Orange", "Red"])
+
+
+class DeviceStateTests(TestCase):
+    def setUp(self):
+        reset_state()
+        self.device_id = devices.device_pk("state", create=True)
+        self.fed = datetime(2026, 10, 18, 8, 30)
+        feedingData.objects.create(device_id=self.device_id, timestamp=self.fed, data="Feed Successful!")
+        lightData.objects.create(device_id=self.device_id, status="OFF")
+
+    # Written by another process, which only updates its own local cache
+    def write_elsewhere(self):
+        feedingData.objects.create(device_id=self.device_id, timestamp=self.fed + timedelta(hours=1), data="Feed Successful!")
+        lightData.objects.create(device_id=self.device_id, status="ON", color="red")
+
+    def test_without_shared_cache_reads_latest_rows(self):
+        self.assertEqual(get_device_state(self.device_id)["light"], "OFF")
+        self.write_elsewhere()
+        self.assertEqual(
+            get_device_state(self.device_id),
+            {"feed": (self.fed + timedelta(hours=1)).timestamp(), "light": "ON", "color": "red"},
+        )
+
+    @override_settings(REDIS_URL="redis://cache")
+    def test_shared_cache_answers_between_writes(self):
+        self.assertEqual(get_device_state(self.device_id)["light"], "OFF")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_device_state(self.device_id)["feed"], self.fed.timestamp())
+
+        # The writing process updates the shared cache
+        record_light(lightData.objects.create(device_id=self.device_id, status="ON", color="red"))
+        record_feed(feedingData.objects.create(device_id=self.device_id, timestamp=self.fed + timedelta(hours=1)))
+        self.assertEqual(
+            get_device_state(self.device_id),
+            {"feed": (self.fed + timedelta(hours=1)).timestamp(), "light": "ON", "color": "red"},
+        )
+
+
+class TopicRouterTests(SimpleTestCase):
+    def test_submitted_work_keeps_device_order_off_the_caller_thread(self):
+        handled = []
+        router = TopicRouter(workers=3)
+        router.register(
+            "alerts", lambda deviceId, payload: handled.append((deviceId, payload, threading.current_thread())), POOL
+        )
+        router.start()
+        for i in range(20):
+            router.submit("alerts", f"tank{i % 2}", i)
+        router.stop()
+
+        self.assertEqual([payload for deviceId, payload, _ in handled if deviceId == "tank0"], list(range(0, 20, 2)))
+        self.assertEqual([payload for deviceId, payload, _ in handled if deviceId == "tank1"], list(range(1, 20, 2)))
+        self.assertNotIn(threading.current_thread(), [thread for _, _, thread in handled])
+        self.assertEqual(router.stats()["topics"]["alerts"]["handled"], 20)
+
+
+class NotificationDispatcherTests(TestCase):
+    def setUp(self):
+        LocMemBackend.outbox = []
+        LocMemBackend.responses = {}
+        self.dispatcher = NotificationDispatcher(
+            "project.notifications.LocMemBackend", batch_size=2, retry_backoff=0
+        )
+        self.dispatcher.backend = LocMemBackend()
+        self.data = {"title": "Alert", "body": "Water", "color": "Red"}
+
+    def add_tokens(self, *tokens):
+        for token in tokens:
+            userToken.objects.create(token=token)
+
+    def test_sends_tokens_in_batches(self):
+        self.add_tokens("a", "b", "c", "d", "e")
+        self.dispatcher.dispatch(self.data)
+
+        self.assertEqual([len(sent["tokens"]) for sent in LocMemBackend.outbox], [2, 2, 1])
+        self.assertEqual(LocMemBackend.outbox[0]["data"], self.data)
+        self.assertEqual(self.dispatcher.sent, 5)
+
+    def test_prunes_unregistered_tokens(self):
+        self.add_tokens("a", "gone")
+        LocMemBackend.responses = {"gone": UNREGISTERED}
+        self.dispatcher.dispatch(self.data)
+
+        self.assertEqual(list(userToken.objects.values_list("token", flat=True)), ["a"])
+        self.assertEqual(self.dispatcher.pruned, 1)
+
+    def test_retries_transient_failures(self):
+        self.add_tokens("a", "busy")
+        LocMemBackend.responses = {"busy": TRANSIENT}
+        self.dispatcher.dispatch(self.data)
+
+        # One multicast, then the failed token alone on every retry
+        self.assertEqual(len(LocMemBackend.outbox), 1 + self.dispatcher.max_retries)
+        self.assertEqual(LocMemBackend.outbox[1]["tokens"], ["busy"])
+        self.assertEqual(self.dispatcher.sent, 1)
+        self.assertEqual(self.dispatcher.failed, 1)
+
+        LocMemBackend.outbox = []
+        LocMemBackend.responses = {"busy": SENT}
+        self.dispatcher.dispatch(self.data)
+        self.assertEqual(self.dispatcher.sent, 3)
+
+    def test_only_dead_tokens_are_pruned(self):
+        errors = [
+            messaging.UnregisteredError("gone"),
+            messaging.SenderIdMismatchError("other project"),
+            exceptions.InvalidArgumentError("payload too large"),
+            exceptions.UnavailableError("try later"),
+        ]
+        response = SimpleNamespace(responses=[
+            SimpleNamespace(success=False, exception=error) for error in errors
+        ])
+        firebase = SimpleNamespace(messaging=SimpleNamespace(
+            UnregisteredError=messaging.UnregisteredError,
+            SenderIdMismatchError=messaging.SenderIdMismatchError,
+            QuotaExceededError=messaging.QuotaExceededError,
+            MulticastMessage=messaging.MulticastMessage,
+            send_each_for_multicast=lambda message: response,
+        ))
+        with mock.patch.dict(sys.modules, {"project.firebase_config": firebase}):
+            backend = FirebaseBackend()
+
+        outcomes = backend.send_multicast(["a", "b", "c", "d"], {"title": "Alert"})
+        self.assertEqual(outcomes, [UNREGISTERED, UNREGISTERED, FAILED, TRANSIENT])
+
+
+class RecurrenceTests(TestCase):
+    def setUp(self):
+        reset_state()
+        self.device_id = devices.device_pk("schedule", create=True)
+        # A Friday
+        self.friday = date(2026, 10, 16)
+
+    def task(self, freq, interval=1, **fields):
+        return schedule(
+            device_id=self.device_id, workingDate=self.friday, workingTime=time(8, 30),
+            desc=schedule.Description.Feeding, freq=freq, interval=interval, **fields,
+        )
+
+    def due(self, task, days=4):
+        start = datetime.combine(self.friday, time())
+        return list(occurrences(task, start, start + timedelta(days=days)))
+
+    def at(self, day, hour=8, minute=30):
+        return datetime.combine(self.friday + timedelta(days=day), time(hour, minute))
+
+    def test_one_off_runs_once(self):
+        self.assertEqual(self.due(self.task(schedule.Frequency.Today)), [self.at(0)])
+
+    def test_everyday(self):
+        self.assertEqual(self.due(self.task(schedule.Frequency.Everyday), 3), [self.at(0), self.at(1), self.at(2)])
+
+    def test_weekdays_skip_the_weekend(self):
+        self.assertEqual(self.due(self.task(schedule.Frequency.Weekdays)), [self.at(0), self.at(3)])
+
+    def test_hourly_interval(self):
+        start = datetime.combine(self.friday, time())
+        due = list(occurrences(self.task(schedule.Frequency.Hourly, 6), start, start + timedelta(days=1)))
+        self.assertEqual(due, [self.at(0, 8), self.at(0, 14), self.at(0, 20)])
+
+    def test_logged_occurrences_are_skipped(self):
+        task = self.task(schedule.Frequency.Everyday)
+        logged = {self.at(0), self.at(1)}
+        self.assertEqual(next_pending(task, self.at(0, 0), logged), self.at(2))
+
+    def test_migration_logs_the_run_it_unshifts(self):
+        task = self.task(schedule.Frequency.Everyday, status=schedule.Status.Success)
+        task.save()
+        migration = importlib.import_module("project.migrations.0012_schedule_recurrence")
+        migration.unshift_everyday(apps, None)
+
+        task.refresh_from_db()
+        self.assertEqual((task.workingDate, task.status), (self.friday - timedelta(days=1), "Pending"))
+        run = scheduleRun.objects.get(schedule=task)
+        self.assertEqual((run.dueAt, run.status), (self.at(-1), scheduleRun.Status.Success))
+        # Today's feed already happened, the next one is tomorrow
+        self.assertEqual(next_pending(task, self.at(-1, 0), {run.dueAt}), self.at(0))
+
+
+class LeaderLeaseTests(TestCase):
+    def setUp(self):
+        self.events = []
+        self.first = self.lease("first")
+        self.second = self.lease("second")
+
+    def lease(self, name):
+        return LeaderLease(
+            "scheduler",
+            lambda: self.events.append(f"{name} elected"),
+            lambda: self.events.append(f"{name} revoked"),
+            ttl=30,
+        )
+
+    def test_one_holder_at_a_time(self):
+        self.assertTrue(self.first.try_acquire())
+        self.assertFalse(self.second.try_acquire())
+        # The holder renews its own lease
+        self.assertTrue(self.first.try_acquire())
+
+    def test_takeover_after_expiry(self):
+        self.first.try_acquire()
+        leaderLease.objects.filter(name="scheduler").update(expiresAt=Now() - timedelta(seconds=1))
+
+        self.assertTrue(self.second.try_acquire())
+        self.assertFalse(self.first.try_acquire())
+        self.assertEqual(leaderLease.objects.get(name="scheduler").holder, self.second.holder)
+
+    # One pass of the renew loop, on this thread and connection
+    def renew(self, lease):
+        lease._stopped.clear()
+        stop = mock.patch.object(lease._stopped, "wait", side_effect=lambda timeout: lease._stopped.set())
+        with mock.patch("project.leader.close_old_connections"), stop:
+            lease._run()
+
+    def test_failover(self):
+        self.renew(self.first)
+        self.renew(self.second)
+        leaderLease.objects.filter(name="scheduler").update(expiresAt=Now() - timedelta(seconds=1))
+        self.renew(self.second)
+        self.renew(self.first)
+
+        self.assertEqual(self.events, ["first elected", "second elected", "first revoked"])
+        self.assertTrue(self.second.is_leader)
+        self.assertFalse(self.first.is_leader)
+
+
+class ScheduleClaimTests(TestCase):
+    def setUp(self):
+        reset_state()
+        self.task = schedule.objects.create(
+            device_id=devices.device_pk("claim", create=True), workingDate=date(2026, 10, 16),
+            workingTime=time(8, 30), desc=schedule.Description.Feeding, freq=schedule.Frequency.Today,
+        )
+        self.due = datetime(2026, 10, 16, 8, 30)
+
+    def test_occurrence_is_claimed_once(self):
+        task, run = claim_run(self.task.id, self.due, scheduleRun.Status.Running)
+        self.assertEqual((task.id, run.status), (self.task.id, scheduleRun.Status.Running))
+        self.assertEqual(claim_run(self.task.id, self.due, scheduleRun.Status.Missed), (None, None))
+
+    @mock.patch("project.scheduler.feed", return_value={"message": "Feed Successful!"})
+    def test_schedule_runs_once(self, feed):
+        run_schedule(self.task.id, self.due)
+        run_schedule(self.task.id, self.due)
+
+        feed.assert_called_once()
+        run = scheduleRun.objects.get(schedule=self.task)
+        self.assertEqual((run.status, run.result), (scheduleRun.Status.Success, "Feed Successful!"))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, schedule.Status.Success)
+
+
+class RollupRetentionTests(TestCase):
+    def setUp(self):
+        reset_state()
+        self.device_id = devices.device_pk("rollup", create=True)
+        self.today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def add_readings(self, start, count, eval=sensorData.Evaluate.Green):
+        readings = [
+            sensorData(
+                device_id=self.device_id, recorded_at=start + timedelta(minutes=10 * i),
+                timestamp=start + timedelta(minutes=10 * i), eval=eval, **GREEN,
+            )
+            for i in range(count)
+        ]
+        sensorData.objects.bulk_create(readings)
+        update_rollups(readings)
+
+    def days(self):
+        return {
+            rollup.bucket: rollup.count
+            for rollup in sensorRollup.objects.filter(device_id=self.device_id, grain=sensorRollup.Grain.Day)
+        }
+
+    def snapshot(self):
+        return list(
+            sensorRollup.objects.filter(device_id=self.device_id)
+            .order_by("grain", "bucket")
+            .values("grain", "bucket", "count", "sumTemp", "greenMinutes", "redMinutes", "lastRecordedAt")
+        )
+
+    def test_ingest_matches_rebuild(self):
+        start = self.today - timedelta(days=1) + timedelta(hours=23)
+        # Two batches across midnight, the second one red
+        self.add_readings(start, 6)
+        self.add_readings(start + timedelta(hours=1), 4, sensorData.Evaluate.Red)
+        incremental = self.snapshot()
+
+        rebuild_rollups(device_id=self.device_id)
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(self.days(), {start.replace(hour=0): 6, self.today: 4})
+
+    @override_settings(RAW_RETENTION_DAYS=30, RETENTION_ARCHIVE_DIR="")
+    def test_purged_days_keep_their_rollups(self):
+        old = self.today - timedelta(days=40)
+        self.add_readings(old, 6)
+        self.add_readings(self.today, 3)
+        apply_retention()
+
+        self.assertEqual(sensorData.objects.filter(device_id=self.device_id).count(), 3)
+        self.assertEqual(self.days(), {old: 6, self.today: 3})
+
+        # Neither an unranged rebuild nor one over the purged day drops it
+        rebuild_rollups()
+        rebuild_rollups(old, self.today + timedelta(days=1), device_id=self.device_id)
+        self.assertEqual(self.days(), {old: 6, self.today: 3})
+
+    def test_partly_purged_day_is_not_rebuilt(self):
+        day = self.today - timedelta(days=2)
+        self.add_readings(day, 6)
+        self.add_readings(self.today, 3)
+        sensorData.objects.filter(device_id=self.device_id, recorded_at__lt=day + timedelta(minutes=30)).delete()
+
+        rebuild_rollups(device_id=self.device_id)
+        self.assertEqual(self.days(), {day: 6, self.today: 3})
+
+
+class SensorPayloadTests(TestCase):
+    def test_json_reading(self):
+        format, readings = decode_sensor_payload(json.dumps(GREEN).encode())
+        self.assertEqual(format, "json")
+        self.assertEqual(readings, [{**GREEN, "measured_at": None}])
+
+    def test_json_batch(self):
+        batch = [{**GREEN, "measured_at": 1700000000 + i} for i in range(3)]
+        format, readings = decode_sensor_payload(json.dumps(batch))
+        self.assertEqual(format, "json")
+        self.assertEqual([reading["measured_at"] for reading in readings], [1700000000, 1700000001, 1700000002])
+
+    def test_msgpack_map_and_arrays(self):
+        format, readings = decode_sensor_payload(msgpack.packb({**GREEN, "measured_at": 1700000000}))
+        self.assertEqual(format, "msgpack")
+        self.assertEqual(readings, [{**GREEN, "measured_at": 1700000000}])
+
+        payload = msgpack.packb([[1700000000, 26, 7.4, 300, 80], [1700000060, 27, 7.5, 310, 79]])
+        format, readings = decode_sensor_payload(payload)
+        self.assertEqual(len(readings), 2)
+        self.assertEqual(readings[1], {"measured_at": 1700000060, "temp": 27.0, "ph": 7.5, "tds": 310.0, "waterLv": 79.0})
+
+    def test_struct_batch(self):
+        payload = STRUCT_HEADER.pack(b"FF", 1, 2) + STRUCT_READING.pack(1700000000, 26, 7.5, 300, 80)
+        payload += STRUCT_READING.pack(0, 27, 7.5, 310, 79)
+        format, readings = decode_sensor_payload(payload)
+
+        self.assertEqual(format, "struct")
+        self.assertEqual(readings[0], {"measured_at": 1700000000, "temp": 26.0, "ph": 7.5, "tds": 300.0, "waterLv": 80.0})
+        # 0 is a device without a clock
+        self.assertIsNone(readings[1]["measured_at"])
+
+    def test_rejects_invalid_payloads(self):
+        invalid = [
+            b'{"temp": "hot", "ph": 7, "tds": 300, "waterLv": 80}',
+            b'{"temp": 26, "ph": 7}',
+            STRUCT_HEADER.pack(b"FF", 2, 0),
+            STRUCT_HEADER.pack(b"FF", 1, 2) + STRUCT_READING.pack(0, 26, 7, 300, 80),
+            b'"reading"',
+        ]
+        for payload in invalid:
+            with self.assertRaises((ValueError, struct.error)):
+                decode_sensor_payload(payload)
+
+    @override_settings(SENSOR_PAYLOAD_MAX_READINGS=2)
+    def test_rejects_oversized_batch(self):
+        with self.assertRaises(ValueError):
+            decode_sensor_payload(json.dumps([GREEN] * 3))
+
+
+@mock.patch("project.mqtt_client.mqtt_client_instance.publish")
+class ReplayIngestTests(TestCase):
+    def setUp(self):
+        reset_state()
+        self.device_id = devices.device_pk("replay", create=True)
+        self.start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+
+    def backlog(self, first, count):
+        return [
+            {**GREEN, "measured_at": (self.start + timedelta(minutes=10 * i)).timestamp()}
+            for i in range(first, first + count)
+        ]
+
+    # What the handler hands to the write buffer for one message
+    def ingest(self, readings):
+        batch = process_sensor_readings(readings, self.device_id)
+        self.assertIsNotNone(batch)
+        self.assertEqual(sensor_buffer.queue.get_nowait(), batch)
+        store_sensor_batch(batch)
+
+    def test_replayed_batch_is_one_insert(self, publish):
+        batch = process_sensor_readings(self.backlog(0, 6), self.device_id)
+        self.assertEqual(sensor_buffer.queue.get_nowait(), batch)
+
+        with CaptureQueriesContext(connection) as queries:
+            store_sensor_batch(batch)
+        inserts = [
+            query for query in queries.captured_queries
+            if query["sql"].startswith('INSERT INTO "project_sensordata"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(sensorData.objects.filter(device_id=self.device_id).count(), 6)
+
+    def test_duplicates_are_skipped(self, publish):
+        self.ingest(self.backlog(0, 6))
+        # Overlapping replay, with a reading repeated inside the batch
+        self.ingest(self.backlog(3, 6) + self.backlog(8, 1))
+
+        stored = sensorData.objects.filter(device_id=self.device_id)
+        self.assertEqual(stored.count(), 9)
+        self.assertEqual(stored.values("measured_at").distinct().count(), 9)
+
+    def test_alerts_are_handed_to_the_device_lane(self, publish):
+        with mock.patch.object(mqtt_client_instance.router, "submit") as submit:
+            batch = process_sensor_readings(self.backlog(0, 3), self.device_id)
+        sensor_buffer.queue.get_nowait()
+        # Newest reading only
+        submit.assert_called_once_with("alerts", "replay", batch[2])
+
+    def test_readings_without_device_time_are_kept(self, publish):
+        self.ingest([GREEN, GREEN])
+        self.assertEqual(sensorData.objects.filter(device_id=self.device_id).count(), 2)
+
+    def test_replayed_readings_keep_their_time(self, publish):
+        self.ingest(self.backlog(0, 12))
+
+        first = sensorData.objects.filter(device_id=self.device_id).order_by("recorded_at").first()
+        self.assertEqual(first.recorded_at, self.start)
+        self.assertEqual(first.timestamp, self.start)
+
+        # Two hours of readings, ten minutes apart, in their own buckets
+        hours = sensorRollup.objects.filter(
+            device_id=self.device_id, grain=sensorRollup.Grain.Hour
+        ).order_by("bucket")
+        self.assertEqual([hour.bucket for hour in hours], [self.start, self.start + timedelta(hours=1)])
+        self.assertEqual([hour.count for hour in hours], [6, 6])
+        self.assertEqual([hour.greenMinutes for hour in hours], [50.0, 60.0])
+
+    def test_posted_reading_already_replayed_is_skipped(self, publish):
+        self.ingest(self.backlog(0, 3))
+        reading = {**GREEN, "device": "replay", "measured_at": self.start.isoformat()}
+        response = self.client.post(
+            "/project/sensorDataDisplay/", json.dumps(reading), content_type="application/json"
+        )
+
+        self.assertEqual(response.json()["message"], "Data already stored")
+        self.assertEqual(sensorData.objects.filter(device_id=self.device_id).count(), 3)
+        hour = sensorRollup.objects.get(device_id=self.device_id, grain=sensorRollup.Grain.Hour)
+        self.assertEqual(hour.count, 3)
+
+    def test_device_clock_ahead_is_capped(self, publish):
+        ahead = datetime.now() + timedelta(days=1)
+        self.ingest([{**GREEN, "measured_at": ahead.timestamp()}])
+
+        reading = sensorData.objects.get(device_id=self.device_id)
+        self.assertEqual(reading.measured_at, ahead)
+        self.assertLessEqual(reading.timestamp, datetime.now())
+        self.assertEqual(reading.recorded_at, reading.timestamp)
+
+    def test_bad_device_time_drops_only_that_reading(self, publish):
+        readings = self.backlog(0, 3)
+        readings[1]["measured_at"] = 1e20
+        readings.append({**GREEN, "measured_at": "yesterday"})
+        self.ingest(readings)
+
+        stored = sensorData.objects.filter(device_id=self.device_id).order_by("recorded_at")
+        self.assertEqual(
+            [reading.measured_at for reading in stored], [self.start, self.start + timedelta(minutes=20)]
+        )
@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+import zlib
+
+from django.db import close_old_connections
+
+from .devices import parse_topic
+
+INLINE = "inline"
+POOL = "pool"
+
+
+class TopicRouter:
+    # Maps a topic suffix (Freshyfishy/[<deviceId>/]<suffix>) to a handler
+    # and the executor it runs on. Inline handlers run on paho's network
+    # thread and must stay cheap; pool handlers are queued to worker lanes.
+    # A device always lands on the same lane, so its messages are handled
+    # in arrival order, and a burst on one topic can't hold up the inline
+    # ones (sensor readings, command responses).
+    def __init__(self, workers=4, max_size=1000):
+        self.workers = workers
+        self.max_size = max_size
+        self.routes = {}
+        self.counters = {}
+        self.unrouted = 0
+
+        self._lock = threading.Lock()
+        self._lanes = []
+        self._threads = []
+
+    # Handlers get the payload as text unless registered with text=False
+    def register(self, suffix, handler, executor=INLINE, text=True):
+        self.routes[suffix] = (handler, executor, text)
+        self.counters[suffix] = {
+            "queued": 0, "handled": 0, "errors": 0, "dropped": 0,
+            "total_ms": 0.0, "max_ms": 0.0,
+        }
+
+    def start(self):
+        if self._threads:
+            return
+        self._lanes = [queue.Queue(maxsize=self.max_size) for _ in range(self.workers)]
+        for i, lane in enumerate(self._lanes):
+            thread = threading.Thread(
+                target=self._run, args=[lane], name=f"topic-lane-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        # Lanes finish what is already queued, then exit on the sentinel
+        for lane in self._lanes:
+            lane.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def dispatch(self, topic, payload):
+        deviceId, suffix = parse_topic(topic)
+        route = self.routes.get(suffix)
+        if route is None:
+            self.unrouted += 1
+            return False
+
+        handler, executor, text = route
+        if text:
+            payload = payload.decode("utf-8", errors="replace")
+        return self._queue(suffix, handler, executor, deviceId, payload)
+
+    # Work a handler hands on to a route of its own (no MQTT message), on
+    # the same device lane so it keeps the device's arrival order
+    def submit(self, suffix, deviceId, payload):
+        handler, executor, _ = self.routes[suffix]
+        return self._queue(suffix, handler, executor, deviceId, payload)
+
+    def _queue(self, suffix, handler, executor, deviceId, payload):
+        received = time.monotonic()
+        # Not started (web workers): everything runs inline
+        if executor == INLINE or not self._threads:
+            self._handle(suffix, handler, deviceId, payload, received)
+            return True
+
+        lane = self._lanes[zlib.crc32(deviceId.encode()) % len(self._lanes)]
+        try:
+            lane.put_nowait((suffix, handler, deviceId, payload, received))
+        except queue.Full:
+            self._count(suffix, dropped=1)
+            print(f"Topic lane full, dropped {suffix} message from {deviceId}")
+            return False
+        self._count(suffix, queued=1)
+        return True
+
+    def stats(self):
+        with self._lock:
+            topics = {}
+            for suffix, counter in self.counters.items():
+                handled = counter["handled"]
+                topics[suffix] = {
+                    "executor": self.routes[suffix][1],
+                    "queued": counter["queued"],
+                    "handled": handled,
+                    "errors": counter["errors"],
+                    "dropped": counter["dropped"],
+                    "avg_ms": round(counter["total_ms"] / handled, 2) if handled else None,
+                    "max_ms": round(counter["max_ms"], 2),
+                }
+        return {
+            "topics": topics,
+            "lanes": [lane.qsize() for lane in self._lanes],
+            "unrouted": self.unrouted,
+        }
+
+    def _count(self, suffix, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                self.counters[suffix][key] += value
+
+    def _handle(self, suffix, handler, deviceId, payload, received):
+        failed = 0
+        try:
+            handler(deviceId, payload)
+        except Exception as e:
+            failed = 1
+            print(f"Error handling {suffix} message from {deviceId}: {str(e)}")
+
+        # Latency from arrival to done, time spent queued included
+        elapsed = (time.monotonic() - received) * 1000
+        with self._lock:
+            counter = self.counters[suffix]
+            counter["handled"] += 1
+            counter["errors"] += failed
+            counter["total_ms"] += elapsed
+            counter["max_ms"] = max(counter["max_ms"], elapsed)
+
+    def _run(self, lane):
+        while True:
+            item = lane.get()
+            if item is None:
+                return
+            close_old_connections()
+            self._handle(*item)
+            self._count(item[0], queued=-1)
@@ -5,9 +5,13 @@ urlpatterns =[
     path('test-noti/', sendPushNotification, name='test-noti'),
     path('feedingControl/', feedingControl, name='feeding-control'),
     path('lightControl/', lightControl, name='light-control'),
+    path('pumpControl/', pumpControl, name='pump-control'),
     path('sensorDataDisplay/', sensorDataDisplay, name='sensorDataDisplay'),
     path('saveToken/', saveToken, name='saveToken'),
     path('schedule/', scheduleData, name='schedule-data'),
     path('preferences/', preferences, name='preferences'),
-    path('report/', report, name='report')
+    path('report/', report, name='report'),
+    path('report/summary/', reportSummary, name='report-summary'),
+    path('events/', events, name='events'),
+    path('ingestStats/', ingestStats, name='ingest-stats'),
 ]
@@ -1,62 +1,89 @@
-from django.http import JsonResponse
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
 from .models import *
 from django.views.decorators.csrf import csrf_exempt
 import json
 from django.utils import timezone
-from .firebase_config import messaging
-from firebase_admin import messaging
 from datetime import datetime, timedelta
+from django.db.models import Prefetch, Q
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 import time
 from .mqtt_client import *
-from django.db.models.functions import TruncDate, TruncTime
-
-
-def save_schedule(workingTime, desc, freq):
+from .alerts import check_alerts
+from .device_state import get_device_state
+from .devices import device_name, device_pk, device_topic
+from .evaluation import get_rules, regrade_sensor_data
+from .events import event_stream, format_event, publish_event
+from .notifications import sendPushNotification
+from .recurrence import occurrences
+from .preferences import DEFAULT_PREFS, get_thresholds
+from .reports import (
+    parse_report_params,
+    parse_summary_params,
+    stream_report,
+    summarize_sensor_data,
+)
+from .tank_state import TANK_STATE_FIELDS, get_tank_state
+
+
+# Tank a request is about: "device" in the JSON body or the query string,
+# the original tank when neither is given
+def request_device(request, data=None):
+    deviceId = (data or {}).get("device") or request.GET.get("device") or DEFAULT_DEVICE
+    return device_pk(deviceId)
+
+
+async def save_schedule(device_id, workingTime, desc, freq, interval=1):
     workingDate = timezone.now().date()
     status = "Pending"  # Added in server
 
-    schedule.objects.create(
+    await schedule.objects.acreate(
+        device_id=device_id,
         workingTime=workingTime,
         workingDate=workingDate,
         desc=desc,
         freq=freq,
+        interval=max(1, int(interval)),
         status=status,
     )
 
     return {"message": "Schedule created successfully"}
 
 
-def feed_instant():
+# Device commands are awaited, a pending command holds no worker thread
+async def afeed_instant(device_id):
     try:
-        mqtt_client_instance.connect()
-        mqtt_client_instance.subscribe("Freshyfishy/response")
-
-        mqtt_client_instance.publish("Freshyfishy/command", "Feed")
-        print(f"--------------- Feed command sent.")
-
-        mqtt_client_instance.loop_until_response()
+        print(f"--------------- Sending feed command.")
+        deviceId = await sync_to_async(device_name)(device_id)
+        response = await device_commands.acall("Feed", device=deviceId)
 
-        print(f"*************** {mqtt_client_instance.response_data}")
+        print(f"*************** {response}")
 
         timestamp = timezone.now()
-        feedingData.objects.create(
-            data=mqtt_client_instance.response_data, timestamp=timestamp
-        )
+        await feedingData.objects.acreate(device_id=device_id, data=response, timestamp=timestamp)
 
-        mqtt_client_instance.reset_response_data()
-        mqtt_client_instance.update_status()
+        await sync_to_async(mqtt_client_instance.update_status)(device_id)
 
         return {"message": "Feed instant triggered successfully"}
     except Exception as e:
         return {"error": f"IoT feed request failed: {str(e)}"}
 
 
+# Blocking entry point for the scheduler thread
+def feed_instant(device_id):
+    return async_to_sync(afeed_instant)(device_id)
+
+
 @csrf_exempt
-def feedingControl(request):
+async def feedingControl(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
+            device_id = await sync_to_async(request_device)(request, data)
 
             action = data.get("action")
             print(f"Received {action} action")
@@ -66,26 +93,18 @@ def feedingControl(request):
                 working_time = data.get("workingTime")
                 desc = data.get("desc")
                 freq = data.get("freq")
-                current_time = datetime.now().strftime("%H:%M")
-                print(current_time)
                 print(f"Received Schedule Feed action with status: {desc, freq}")
 
-                if working_time == current_time:
-                    result = save_schedule(working_time, desc, freq)
-                    feed_instant()
-                    current_schedule = schedule.objects.latest("timestamp")
-                    current_schedule.status = "Success"
-                    current_schedule.save()
-
-                    print(f"Updated status of latest schedule to 'Success'")
-                else:
-                    result = save_schedule(working_time, desc, freq)
+                # A time that is due now runs within the scheduler's grace window
+                result = await save_schedule(
+                    device_id, working_time, desc, freq, data.get("interval", 1)
+                )
 
                 return JsonResponse(result, status=201)
 
             elif action == "Instant":
                 print(f"Received 'Instant Feed' action")
-                result = feed_instant()
+                result = await afeed_instant(device_id)
                 return JsonResponse(result, status=200)
 
             else:
@@ -96,54 +115,57 @@ def feedingControl(request):
 
     elif request.method == "GET":
         try:
-            latest_data = feedingData.objects.latest("timestamp")
+            device_id = await sync_to_async(request_device)(request)
+            latest_data = await feedingData.objects.filter(device_id=device_id).alatest("recorded_at")
             return JsonResponse(
                 {
                     "data": latest_data.data,
                     "timestamp": latest_data.timestamp.timestamp(),
                 }
             )
+        except device.DoesNotExist:
+            return JsonResponse({"error": "Unknown device"}, status=404)
         except feedingData.DoesNotExist:
             return JsonResponse({"message": "No data found", "timestamp": None})
 
     return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
-def light_instant(switch, color):
+async def alight_instant(device_id, switch, color):
     print(f"Received 'Instant' action with status: {switch, color}")
     try:
-        mqtt_client_instance.connect()
-        mqtt_client_instance.subscribe("Freshyfishy/response")
-
         payload = f"{switch}/{color}"
         print(f"----------------", payload)
-        mqtt_client_instance.publish("Freshyfishy/command", payload)
+        deviceId = await sync_to_async(device_name)(device_id)
+        response = await device_commands.acall(payload, device=deviceId)
 
-        mqtt_client_instance.loop_until_response()
+        print(f"*****************", response)
 
-        print(f"*****************", mqtt_client_instance.response_data)
-
-        mqtt_client_instance.reset_response_data()
-        mqtt_client_instance.update_status()
+        await sync_to_async(mqtt_client_instance.update_status)(device_id)
 
         return {"message": "Light switching triggered successfully"}
     except Exception as e:
         return {"error": f"IoT light request failed: {str(e)}"}
 
 
+def light_instant(device_id, switch, color):
+    return async_to_sync(alight_instant)(device_id, switch, color)
+
+
 @csrf_exempt
-def lightControl(request):
+async def lightControl(request):
     if request.method == "POST":
         try:
             print(f"Raw request body: {request.body}")
             data = json.loads(request.body)
+            device_id = await sync_to_async(request_device)(request, data)
 
             action = data.get("action")
             status = data.get("status")
-            latestcolor = lightData.objects.order_by("-timestamp").first()
+            latestcolor = await lightData.objects.filter(device_id=device_id).order_by("-recorded_at").afirst()
             if not latestcolor:
-                latestcolor = lightData.objects.create(
-                    timestamp=timezone.now(), status="OFF", color="rgb(245, 255, 197)"
+                latestcolor = await lightData.objects.acreate(
+                    device_id=device_id, timestamp=timezone.now(), status="OFF", color="rgb(245, 255, 197)"
                 )
 
             color = latestcolor.color
@@ -153,21 +175,12 @@ def lightControl(request):
                 working_time = data.get("workingTime")
                 freq = data.get("freq")
                 desc = data.get("desc")
-                switch = "ON" if "ON" in desc else "OFF"
-                current_time = datetime.now().strftime("%H:%M")
-                print(current_time)
                 print(f"Received Schedule Light action with status: {desc, freq}")
 
-                if working_time == current_time:
-                    result = save_schedule(working_time, desc, freq)
-                    light_instant(switch, color)
-                    current_schedule = schedule.objects.latest("timestamp")
-                    current_schedule.status = "Success"
-                    current_schedule.save()
-
-                    print(f"Updated status of latest schedule to 'Success'")
-                else:
-                    result = save_schedule(working_time, desc, freq)
+                # A time that is due now runs within the scheduler's grace window
+                result = await save_schedule(
+                    device_id, working_time, desc, freq, data.get("interval", 1)
+                )
 
                 return JsonResponse(result, status=201)
 
@@ -175,11 +188,11 @@ def lightControl(request):
             elif action == "Instant":
 
                 print(f"Received 'Instant Light' action")
-                result = light_instant(status, color)
+                result = await alight_instant(device_id, status, color)
                 # Log the event
                 timestamp = timezone.now()
-                lightData.objects.create(
-                    timestamp=timestamp, status=status, color=color
+                await lightData.objects.acreate(
+                    device_id=device_id, timestamp=timestamp, status=status, color=color
                 )
                 return JsonResponse(result, status=200)
 
@@ -188,32 +201,40 @@ def lightControl(request):
 
     elif request.method == "GET":
         try:
-            latest_data = lightData.objects.latest("timestamp")
+            device_id = await sync_to_async(request_device)(request)
+            latest_data = await lightData.objects.filter(device_id=device_id).alatest("recorded_at")
             return JsonResponse(
                 {"status": latest_data.status, "color": latest_data.color}
             )
+        except device.DoesNotExist:
+            return JsonResponse({"error": "Unknown device"}, status=404)
         except lightData.DoesNotExist:
-            latest_data = lightData.objects.create(
-                timestamp=timezone.now(), status="OFF", color="rgb(245, 255, 197)"
+            latest_data = await lightData.objects.acreate(
+                device_id=device_id, timestamp=timezone.now(), status="OFF", color="rgb(245, 255, 197)"
             )
         return JsonResponse({"status": latest_data.status, "color": latest_data.color})
 
     elif request.method == "PUT":
         try:
             data = json.loads(request.body)
+            device_id = await sync_to_async(request_device)(request, data)
             rgb = data.get("color")
             print(f"Received 'Light Color Changing' action with RGB: {rgb}")
 
-            latest_data = lightData.objects.latest("timestamp")
-            latest_data.color = rgb
-            latest_data.save()
+            # Append a new row instead of rewriting the latest one
+            previous = await lightData.objects.filter(device_id=device_id).alatest("recorded_at")
+            latest_data = await lightData.objects.acreate(
+                device_id=device_id, timestamp=timezone.now(), status=previous.status, color=rgb
+            )
 
             switch = latest_data.status
             color = latest_data.color
-            result = light_instant(switch, color)
+            result = await alight_instant(device_id, switch, color)
 
             return JsonResponse(result, status=200)
 
+        except device.DoesNotExist:
+            return JsonResponse({"error": "Unknown device"}, status=404)
         except lightData.DoesNotExist:
             return JsonResponse({"message": "No data found", "timestamp": None})
 
@@ -221,7 +242,39 @@ def lightControl(request):
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
-def sensorEval(action, data):
+PUMP_ACTIONS = {
+    "Drainage": ["Start", "Stop", "30", "100"],
+    "Refilling": ["Start", "Stop"],
+}
+
+
+@csrf_exempt
+async def pumpControl(request):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            device_id = await sync_to_async(request_device)(request, data)
+            pump = data.get("pump")
+            action = data.get("action")
+            print(f"Received {pump} action: {action}")
+
+            if action not in PUMP_ACTIONS.get(pump, []):
+                return JsonResponse({"error": "Invalid pump or action"}, status=400)
+
+            # The device acknowledges at once, completion arrives on
+            # Freshyfishy/pump and is pushed to clients as a "pump" event
+            deviceId = await sync_to_async(device_name)(device_id)
+            response = await device_commands.acall(f"{pump}/{action}", device=deviceId)
+            return JsonResponse({"message": response}, status=200)
+
+        except Exception as e:
+            return JsonResponse({"error": f"IoT pump request failed: {str(e)}"}, status=400)
+
+    else:
+        return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+def sensorEval(action, data, device_id):
     if isinstance(data, dict):
         print("Data received from request.body")
         temp = data.get("temp")
@@ -235,46 +288,9 @@ def sensorEval(action, data):
         tds = data.tds
         waterLv = data.waterLv
 
-    preferences = userPreferences.objects.last()
-    if not preferences:
-        preferences = userPreferences.objects.create(
-            minGrnTemp=25.0, maxGrnTemp=27.0,
-            minOrgTemp=24.0, maxOrgTemp=28.0,
-            minGrnPh=7.0, maxGrnPh=7.8,
-            minOrgPh=6.5, maxOrgPh=8.0,
-            minGrnTds=150, maxGrnTds=450,
-            minOrgTds=100, maxOrgTds=500,
-            grnWaterLv=80, orgWaterLv=50,
-            tankHeight=100
-        )
-
+    eval, notice_list = get_rules(device_id).evaluate(temp, ph, tds, waterLv)
 
     if action == "getEval":
-        eval = "Green"
-
-        if (
-            temp < preferences.minOrgTemp
-            or temp > preferences.maxOrgTemp
-            or ph < preferences.minOrgPh
-            or ph > preferences.maxOrgPh
-            or tds < preferences.minOrgTds
-            or tds > preferences.maxOrgTds
-            or waterLv < preferences.orgWaterLv
-            or waterLv > 100
-        ):
-            eval = "Red"
-
-        elif (
-            temp < preferences.minGrnTemp
-            or temp > preferences.maxGrnTemp
-            or ph < preferences.minGrnPh
-            or ph > preferences.maxGrnPh
-            or tds < preferences.minGrnTds
-            or tds > preferences.maxGrnTds
-            or waterLv < preferences.grnWaterLv
-        ):
-            eval = "Orange"
-
         print(temp, ph, tds, waterLv, eval)
 
         return {
@@ -286,38 +302,7 @@ def sensorEval(action, data):
         }
 
     else:
-        toNotice = {}
-
-        # Check for "Red" alerts first
-        if data.temp < preferences.minOrgTemp or data.temp > preferences.maxOrgTemp:
-            toNotice["Temperature"] = "Red"
-        if data.ph < preferences.minOrgPh or data.ph > preferences.maxOrgPh:
-            toNotice["pH"] = "Red"
-        if data.tds < preferences.minOrgTds or data.tds > preferences.maxOrgTds:
-            toNotice["TDS"] = "Red"
-        if data.waterLv < preferences.orgWaterLv or data.waterLv > 100:
-            toNotice["Water Level"] = "Red"
-
-        # Check for "Orange" alerts only if "Red" is NOT already present
-        if "Temperature" not in toNotice and (
-            data.temp < preferences.minGrnTemp or data.temp > preferences.maxGrnTemp
-        ):
-            toNotice["Temperature"] = "Orange"
-        if "pH" not in toNotice and (
-            data.ph < preferences.minGrnPh or data.ph > preferences.maxGrnPh
-        ):
-            toNotice["pH"] = "Orange"
-        if "TDS" not in toNotice and (
-            data.tds < preferences.minGrnTds or data.tds > preferences.maxGrnTds
-        ):
-            toNotice["TDS"] = "Orange"
-        if "Water Level" not in toNotice and data.waterLv < preferences.grnWaterLv:
-            toNotice["Water Level"] = "Orange"
-
-        # Convert dictionary to list of dictionaries (expected format)
-        notice_list = [{key: value} for key, value in toNotice.items()]
-
-        print(data.temp, data.ph, data.tds, data.waterLv, data.eval, notice_list)
+        print(temp, ph, tds, waterLv, eval, notice_list)
         return {"toNotice": notice_list}
 
 
@@ -327,17 +312,33 @@ def sensorDataDisplay(request):
         try:
             data = json.loads(request.body)
             timestamp = timezone.now()
+            device_id = request_device(request, data)
 
-            result = sensorEval("getEval", data)
+            result = sensorEval("getEval", data, device_id)
 
-            sensorData.objects.create(
+            measured_at = parse_measured_at(data.get("measured_at"))
+            reading = sensorData(
+                device_id=device_id,
                 temp=result["temp"],
                 ph=result["ph"],
                 tds=result["tds"],
                 waterLv=result["waterLv"],
-                timestamp=timestamp,
+                timestamp=reading_time(measured_at, timestamp),
+                recorded_at=reading_time(measured_at, timestamp),
+                measured_at=measured_at,
                 eval=result["eval"],
             )
+            # Same write path as MQTT ingest, a reading it already stored is
+            # not stored twice
+            if not save_sensor_rows([reading]):
+                return JsonResponse(
+                    {
+                        "message": "Data already stored",
+                        "timestamp": timestamp.timestamp(),
+                    }
+                )
+            check_alerts(device_id, reading.temp, reading.ph, reading.tds, reading.waterLv)
+            publish_tank_state(reading)
 
             return JsonResponse(
                 {
@@ -350,37 +351,25 @@ def sensorDataDisplay(request):
             return JsonResponse({"error": str(e)}, status=400)
 
     elif request.method == "GET":
+        # Pure cache read, kept up to date by the ingest path
         try:
-            latest_data = sensorData.objects.latest("timestamp")
-            if latest_data.eval in ["Orange", "Red"]:
-                title = "Water Quality Alert"
-
-                if latest_data.eval == "Orange":
-                    body = "Water quality needs attention!"
-                elif latest_data.eval == "Red":
-                    body = "Critical water quality evaluate detected!"
-
-                sendPushNotification(title, body, latest_data.eval)
-
-            result = sensorEval("getToNotice", latest_data)
-            print(f'*********** {result["toNotice"]}')
-
-            display_quality(latest_data, result)
-
-            return JsonResponse(
-                {
-                    "temp": round(latest_data.temp, 1),
-                    "ph": round(latest_data.ph, 1),
-                    "tds": round(latest_data.tds, 1),
-                    "waterLv": latest_data.waterLv,
-                    "timestamp": latest_data.timestamp.timestamp(),
-                    "eval": latest_data.eval,
-                    "toNotice": result["toNotice"],
-                }
-            )
-        except sensorData.DoesNotExist:
+            state = get_tank_state(request_device(request))
+        except device.DoesNotExist:
+            return JsonResponse({"error": "Unknown device"}, status=404)
+        if state is None:
             return JsonResponse({"message": "No data found", "timestamp": None})
 
+        response = JsonResponse({key: state[key] for key in TANK_STATE_FIELDS})
+        response["ETag"] = state["etag"]
+        response["Last-Modified"] = http_date(state["recordedAt"])
+        response["Cache-Control"] = "no-cache"
+        return get_conditional_response(
+            request,
+            etag=state["etag"],
+            last_modified=int(state["recordedAt"]),
+            response=response,
+        )
+
     else:
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
@@ -403,90 +392,44 @@ def saveToken(request):
         return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
-def sendPushNotification(title, body, eval):
-    try:
-        tokens = list(set(userToken.objects.values_list("token", flat=True)))
-
-        if not tokens:
-            return JsonResponse({"status": "error", "message": "No tokens found"})
-
-        message = messaging.MulticastMessage(
-            data={
-                "title": title,
-                "body": body,
-                "color": eval,
-            },
-            tokens=tokens,
-        )
-
-        response = messaging.send_each_for_multicast(message)
-        print(f"FCM Response: {response}")
-
-        for result in response.responses:
-            if result.success:
-                print("Message sent successfully.")
-            else:
-                print(f"Message failed: {result.exception}")
-        print(
-            f"Successfully sent {response.success_count} messages to {len(tokens)} tokens"
-        )
-        return JsonResponse(
-            {
-                "status": "success",
-                "message": f"Notification sent to {response.success_count} tokens",
-            }
-        )
-
-    except Exception as e:
-        print(f"Error sending notification: {str(e)}")
-        return JsonResponse({"status": "error", "message": str(e)})
-
-
 @csrf_exempt
 def scheduleData(request):
     if request.method == "GET":
         try:
-            today = timezone.now().date()
-            next_day = today + timedelta(1)
-            today_schedules = schedule.objects.filter(workingDate=today)
-            everyday_success = schedule.objects.filter(
-                workingDate=next_day, status="Success"
+            start = datetime.combine(timezone.now().date(), datetime.min.time())
+            end = start + timedelta(days=1)
+
+            # Active schedules plus today's one-offs, with today's run log
+            today_schedules = schedule.objects.filter(
+                Q(status=schedule.Status.Pending) | Q(workingDate=start.date()),
+                device_id=request_device(request),
+            ).prefetch_related(
+                Prefetch(
+                    "runs",
+                    queryset=scheduleRun.objects.filter(dueAt__gte=start, dueAt__lt=end),
+                    to_attr="today_runs",
+                )
             )
 
-            print(f"today: {today}, timestamp__date: {today_schedules}")
-            print(f"for everyday: {next_day}, timestamp__date: {everyday_success}")
-
-            # Collect data for each schedule into a list of dictionaries
+            # Collect today's occurrences into a list of dictionaries
             schedules_data = []
-
-            # Add today's schedules
-            for today in today_schedules:
-                schedules_data.append(
-                    {
-                        "id": today.id,
-                        "workingTime": today.workingTime,
-                        "desc": today.desc,
-                        "freq": today.freq,
-                        "status": today.status,
-                    }
-                )
-
-            # Add the "everyday success" schedules
-            for everyday in everyday_success:
-                schedules_data.append(
-                    {
-                        "id": everyday.id,
-                        "workingTime": everyday.workingTime,
-                        "desc": everyday.desc,
-                        "freq": everyday.freq,
-                        "status": everyday.status,
-                    }
-                )
+            for task in today_schedules:
+                runs = {run.dueAt: run.status for run in task.today_runs}
+                for due in occurrences(task, start, end):
+                    schedules_data.append(
+                        {
+                            "id": task.id,
+                            "workingTime": due.time(),
+                            "desc": task.desc,
+                            "freq": task.freq,
+                            "status": runs.get(due, task.status),
+                        }
+                    )
 
             return JsonResponse({"schedules": schedules_data})
 
-        except schedule.DoesNotExist:
-            return JsonResponse({"message": "No data found", "timestamp": None})
+        except device.DoesNotExist:
+            return JsonResponse({"error": "Unknown device"}, status=404)
 
     elif request.method == "DELETE":
         try:
@@ -503,20 +446,35 @@ def scheduleData(request):
             selected_schedule = get_object_or_404(schedule, id=id)
             print(f"Deleting schedule: {selected_schedule}")
 
-            if type == "Permanent":
+            # A one-off schedule has nothing after today, cancelling today
+            # cancels it
+            if type == "Permanent" or (
+                type == "Today" and selected_schedule.freq == schedule.Frequency.Today
+            ):
                 selected_schedule.delete()
                 return JsonResponse(
                     {"message": "Successfully canceled schedule"}, status=200
                 )
             elif type == "Today":
-                today = selected_schedule.workingDate
-
-                if isinstance(today, str):
-                    today = datetime.strptime(today, "%Y-%m-%d").date()
-
-                next_day = today + timedelta(days=1)
-                selected_schedule.workingDate = next_day
-                selected_schedule.save()
+                # Log today's remaining occurrences as skipped
+                now = datetime.now()
+                end = datetime.combine(now.date(), datetime.min.time()) + timedelta(days=1)
+                scheduleRun.objects.bulk_create(
+                    [
+                        scheduleRun(
+                            schedule=selected_schedule,
+                            dueAt=due,
+                            status=scheduleRun.Status.Skipped,
+                        )
+                        for due in occurrences(selected_schedule, now, end)
+                    ],
+                    ignore_conflicts=True,
+                )
+                publish_event(
+                    "schedule",
+                    {"id": selected_schedule.id, "status": selected_schedule.status, "deleted": False},
+                    device=device_name(selected_schedule.device_id),
+                )
 
                 return JsonResponse(
                     {"message": "Schedule shall be handle tomorrow"}, status=200
@@ -535,33 +493,15 @@ def scheduleData(request):
 
 @csrf_exempt
 def preferences(request):
-    # ค่าพื้นฐาน default ถ้ายังไม่มีใน DB
-    DEFAULT_PREFS = {
-        "minGrnTemp": 25.0,
-        "maxGrnTemp": 27.0,
-        "minOrgTemp": 24.0,
-        "maxOrgTemp": 28.0,
-        "minGrnPh": 7.0,
-        "maxGrnPh": 7.8,
-        "minOrgPh": 6.5,
-        "maxOrgPh": 8.0,
-        "minGrnTds": 150,
-        "maxGrnTds": 450,
-        "minOrgTds": 100,
-        "maxOrgTds": 500,
-        "grnWaterLv": 80,
-        "orgWaterLv": 50,
-        "tankHeight": 100,
-    }
-
     if request.method == "PUT":
         try:
             data = json.loads(request.body)
             print(f"Received new preferences setting: {data}")
+            device_id = request_device(request, data)
 
             # get or create default preferences
             preferences, created = userPreferences.objects.get_or_create(
-                id=1, defaults=DEFAULT_PREFS
+                device_id=device_id, defaults=DEFAULT_PREFS
             )
 
             # Update จาก request หรือใช้ค่าปัจจุบัน
@@ -574,15 +514,20 @@ def preferences(request):
 
             preferences.save()
 
-            # Evaluate Latest Sensor Data อีกครั้ง (ถ้ามี)
-            latest_data = sensorData.objects.last()
+            # Re-grade recent sensor data with the new thresholds in one UPDATE
+            since = timezone.now() - timedelta(days=settings.PREFS_REGRADE_DAYS)
+            regraded = regrade_sensor_data(device_id, since)
+            print(f"Re-evaluated {regraded} sensor readings.")
+            # The scheduler rebuilds the rollups, serialized with ingest
+            publish_event("rollups", {"since": since}, device=device_name(device_id))
+
+            latest_data = sensorData.objects.filter(device_id=device_id).order_by("recorded_at", "id").last()
             if latest_data:
-                new_eval = sensorEval("getEval", latest_data)
-                latest_data.eval = new_eval["eval"]
-                latest_data.save()
+                publish_tank_state(latest_data)
 
             mqtt_client_instance.publish(
-                "device/tank", data.get("tankHeight", preferences.tankHeight)
+                device_topic(device_name(device_id), "tank"),
+                data.get("tankHeight", preferences.tankHeight),
             )
 
             return JsonResponse(
@@ -594,86 +539,98 @@ def preferences(request):
 
     elif request.method == "GET":
         try:
-            preferences = userPreferences.objects.last()
-            if not preferences:
-                # สร้าง default ถ้าไม่มี
-                preferences = userPreferences.objects.create(**DEFAULT_PREFS)
-
-            return JsonResponse(
-                {
-                    "minGrnTemp": preferences.minGrnTemp,
-                    "maxGrnTemp": preferences.maxGrnTemp,
-                    "minOrgTemp": preferences.minOrgTemp,
-                    "maxOrgTemp": preferences.maxOrgTemp,
-                    "minGrnPh": preferences.minGrnPh,
-                    "maxGrnPh": preferences.maxGrnPh,
-                    "minOrgPh": preferences.minOrgPh,
-                    "maxOrgPh": preferences.maxOrgPh,
-                    "minGrnTds": preferences.minGrnTds,
-                    "maxGrnTds": preferences.maxGrnTds,
-                    "minOrgTds": preferences.minOrgTds,
-                    "maxOrgTds": preferences.maxOrgTds,
-                    "grnWaterLv": preferences.grnWaterLv,
-                    "orgWaterLv": preferences.orgWaterLv,
-                    "tankHeight": preferences.tankHeight,
-                }
-            )
+            preferences = get_thresholds(request_device(request))
+            return JsonResponse(preferences.as_dict())
 
         except Exception as e:
             return JsonResponse({"message": f"Error occurred: {str(e)}"}, status=500)
 
 
-def display_quality(latest_data, toNotice):
-    mqtt_client_instance.connect()
-    payload = json.dumps(
-        {
-            "eval": latest_data.eval,
-            "notice": toNotice["toNotice"],
-        }
-    )
-    print(f"----------------", payload)
-    mqtt_client_instance.publish("Freshyfishy/quality", payload)
-
-
 @csrf_exempt
 def report(request):
     if request.method == "GET":
         try:
-            sensor_query = (
-                sensorData.objects.annotate(
-                    date=TruncDate("timestamp"), time=TruncTime("timestamp")
-                )
-                .values("date", "time", "temp", "ph", "tds", "waterLv", "eval")
-                .order_by("timestamp")
-            )
+            params = parse_report_params(request.GET)
+            params["device_id"] = request_device(request)
+        except (ValueError, device.DoesNotExist) as e:
+            return JsonResponse({"message": f"Invalid parameter: {str(e)}"}, status=400)
 
-            feeding_query = (
-                feedingData.objects.annotate(
-                    date=TruncDate("timestamp"), time=TruncTime("timestamp")
-                )
-                .values("date", "time", "data")
-                .order_by("timestamp")
-            )
+        return StreamingHttpResponse(
+            stream_report(**params), content_type="application/json"
+        )
 
-            light_query = (
-                lightData.objects.annotate(
-                    date=TruncDate("timestamp"), time=TruncTime("timestamp")
-                )
-                .values("date", "time", "status")
-                .order_by("timestamp")
-            )
+    return JsonResponse({"error": "Invalid request method"}, status=405)
 
-            sensor_data = list(sensor_query)
-            feeding_data = list(feeding_query)
-            light_data = list(light_query)
 
-            for data in sensor_data + feeding_data + light_data:
-                data["time"] = data["time"].strftime("%H:%M")
+@csrf_exempt
+def reportSummary(request):
+    if request.method == "GET":
+        try:
+            params = parse_summary_params(request.GET)
+            params["device_id"] = request_device(request)
+        except (ValueError, device.DoesNotExist) as e:
+            return JsonResponse({"message": f"Invalid parameter: {str(e)}"}, status=400)
 
+        try:
+            series = summarize_sensor_data(**params)
             return JsonResponse(
-                {"sensor": sensor_data, "feeding": feeding_data, "light": light_data},
-                safe=False,
+                {
+                    "bucket": params["bucket"],
+                    "from": params["start"],
+                    "to": params["end"],
+                    "sensor": series,
+                }
             )
-
         except Exception as e:
             return JsonResponse({"message": f"Error occurred: {str(e)}"}, status=500)
+
+    return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+# Topic router, sensor buffer and status publisher counters of the ingest
+# process, as last written to the cache
+@csrf_exempt
+def ingestStats(request):
+    if request.method == "GET":
+        stats = cache.get(INGEST_STATS_KEY)
+        if stats is None:
+            return JsonResponse({"error": "Ingest is not running"}, status=503)
+        return JsonResponse(stats)
+
+    return JsonResponse({"error": "Invalid request method"}, status=405)
+
+
+def current_events(device_id):
+    frames = []
+    deviceId = device_name(device_id)
+    state = get_tank_state(device_id)
+    if state:
+        sensor = {key: state[key] for key in TANK_STATE_FIELDS}
+        frames.append(format_event("sensor", {**sensor, "device": deviceId}))
+    try:
+        frames.append(format_event("status", {**get_device_state(device_id), "device": deviceId}))
+    except (feedingData.DoesNotExist, lightData.DoesNotExist):
+        pass
+    return frames
+
+
+# Server-Sent Events: sensor, status and schedule changes of one tank as
+# they happen
+@csrf_exempt
+async def events(request):
+    if request.method == "GET":
+        try:
+            device_id = await sync_to_async(request_device)(request)
+        except device.DoesNotExist:
+            return JsonResponse({"error": "Unknown device"}, status=404)
+
+        initial = await sync_to_async(current_events)(device_id)
+        deviceId = await sync_to_async(device_name)(device_id)
+        response = StreamingHttpResponse(
+            event_stream(initial, device=deviceId), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    return JsonResponse({"error": "Invalid request method"}, status=405)
@@ -10,7 +10,6 @@ import ReportModal from './reportModal.js';
 import PreferencesModal from './preferencesModal.js';
 import { Button, Modal, Collapse } from 'antd';
 import { SettingOutlined } from '@ant-design/icons';
-import mqtt from 'mqtt';
 
 const Dashboard = () => {
   const [lightStatus, setLightStatus] = useState();
@@ -50,6 +49,32 @@ const Dashboard = () => {
       .catch(() => setLatest('Error'));
   }, []);
 
+  const applySensorData = useCallback((data) => {
+    setSensorData(data);
+    console.log(data)
+
+    const toNotice = data.toNotice || [];
+    setNotificationParameters(toNotice);
+
+    switch (data.eval) {
+      case 'Green':
+        setBgColor('rgba(138, 235, 229, 0.75)');
+        setWaterQual('NORMAL');
+        break;
+      case 'Orange':
+        setBgColor('rgba(255, 154, 3, 0.945)');
+        setWaterQual('CAUTION');
+        break;
+      case 'Red':
+        setBgColor('#f54242');
+        setWaterQual('DANGER');
+        break;
+      default:
+        setBgColor('#8080807a');
+        setWaterQual('UNKNOWN');
+    }
+  }, []);
+
   const fetchAllData = useCallback(() => {
     fetchStatuses();
 
@@ -58,31 +83,7 @@ const Dashboard = () => {
       .catch(() => setPreferences('Error'));
 
     API.fetchSensorData()
-      .then(data => {
-        setSensorData(data);
-        console.log(data)
-
-        const toNotice = data.toNotice || [];
-        setNotificationParameters(toNotice);
-
-        switch (data.eval) {
-          case 'Green':
-            setBgColor('rgba(138, 235, 229, 0.75)');
-            setWaterQual('NORMAL');
-            break;
-          case 'Orange':
-            setBgColor('rgba(255, 154, 3, 0.945)');
-            setWaterQual('CAUTION');
-            break;
-          case 'Red':
-            setBgColor('#f54242');
-            setWaterQual('DANGER');
-            break;
-          default:
-            setBgColor('#8080807a');
-            setWaterQual('UNKNOWN');
-        }
-      })
+      .then(data => applySensorData(data))
       .catch(() => {
         setSensorData({
           temp: 'Error',
@@ -95,18 +96,20 @@ const Dashboard = () => {
         setWaterQual('UNKNOWN');
         setNotificationParameters([]);
       });
-  }, [fetchStatuses]);
+  }, [fetchStatuses, applySensorData]);
 
-  // fetch data every x seconds
+  // fetch once, then follow the changes pushed by the server
   useEffect(() => {
     fetchAllData();
 
-    const interval = setInterval(() => {
-      fetchAllData();
-    }, 120001);
-
-    return () => clearInterval(interval);
-  }, [fetchAllData]);
+    return API.subscribeEvents({
+      sensor: applySensorData,
+      status: (status) => {
+        setLightStatus(status.light);
+        setLatest(status.feed);
+      },
+    });
+  }, [fetchAllData, applySensorData]);
 
   // set no-scroll when open modal
   useEffect(() => {
@@ -166,44 +169,6 @@ const Dashboard = () => {
   };
 
 
-  // MQTT for checking if there's new action schedule ==> fecth and update status when there's any
-  useEffect(() => {
-    // Connect to HiveMQ's WebSocket MQTT broker
-    const client = mqtt.connect("ws://test.mosquitto.org:8080/mqtt");
-
-    client.on("connect", () => {
-      console.log("Connected to HiveMQ MQTT broker");
-
-      // Subscribe to both topics
-      const topics = ["Freshyfishy/response", "Freshyfishy/display"];
-      client.subscribe(topics, (err) => {
-        if (!err) {
-          console.log("Subscribed to topics:", topics);
-        } else {
-          console.error("Subscription error:", err);
-        }
-      });
-    });
-
-    // Handle incoming messages
-    client.on("message", (topic, message) => {
-      console.log(`Message received on ${topic}:`, message.toString());
-
-      if (topic === "Freshyfishy/response" || topic === "Freshyfishy/display") {
-        setTimeout(() => {
-          fetchStatuses();
-        }, 500);
-      }
-    });
-
-    // Cleanup on unmount
-    return () => {
-      client.end();
-    };
-  }, [fetchStatuses]);
-
-
-
   const statusColor = waterQual === 'NORMAL' ? 'black' : 'white';
 
   const solutionText = (parameter) => {
@@ -1,66 +1,54 @@
 import React, { useState, useEffect } from 'react';
-import mqtt from 'mqtt';
+import * as API from '../utils/API.js';
 import '../styles/Modal.css';
 import { Space, Switch, Button, Radio, Collapse } from 'antd';
 
 const { Panel } = Collapse;
 
 const DrainageModal = ({ isOpen, onClose }) => {
-  const [mqttClient, setMqttClient] = useState(null);
   const [selectedWaterLV, setSelectedWaterLV] = useState(null);
   const [autoEnabled, setAutoEnabled] = useState(false);
   const [draining, setDraining] = useState(false);
   const [refilling, setRefilling] = useState(false);
 
-  // Initialize MQTT client
+  // Pump finished or stopped, pushed by the server
   useEffect(() => {
-    const client = mqtt.connect("ws://test.mosquitto.org:8080/mqtt");
-    setMqttClient(client);
-
-    client.on('connect', () => {
-      console.log('MQTT connected');
-      client.subscribe('Freshyfishy/pump');
-    });
-
-    client.on('message', (topic, message) => {
-      if (topic === 'Freshyfishy/pump') {
-        console.log('Drainage response received:', message.toString());
+    return API.subscribeEvents({
+      pump: (data) => {
+        console.log('Drainage response received:', data.message);
         setDraining(false);
         setRefilling(false);
-      }
+      },
     });
-
-    return () => {
-      client.end();
-    };
   }, []);
 
-  const handleDrainageStart = () => {
-    const command = autoEnabled && selectedWaterLV
-      ? `Drainage/${selectedWaterLV}`
-      : 'Drainage/Start';
+  const sendPumpCommand = (pump, action) => {
+    console.log('Sending pump command:', pump, action);
+    return API.pumpControl(pump, action)
+      .catch(error => console.error('Error during pump command:', error));
+  };
 
-    console.log('Publishing command:', command);
+  const handleDrainageStart = () => {
+    const action = autoEnabled && selectedWaterLV
+      ? selectedWaterLV
+      : 'Start';
 
-    mqttClient.publish('Freshyfishy/command', command);
+    sendPumpCommand('Drainage', action);
     setDraining(true);
   };
 
   const handleDrainageStop = () => {
-    console.log('Publishing Stop command');
-    mqttClient.publish('Freshyfishy/command', 'Drainage/Stop');
+    sendPumpCommand('Drainage', 'Stop');
     setDraining(false);
   };
 
   const handleRefillingStart = () => {
-    console.log('Publishing Refilling Start command');
-    mqttClient.publish('Freshyfishy/command', 'Refilling/Start');
+    sendPumpCommand('Refilling', 'Start');
     setRefilling(true);
   };
 
   const handleRefillingStop = () => {
-    console.log('Publishing Stop command');
-    mqttClient.publish('Freshyfishy/command', 'Refilling/Stop');
+    sendPumpCommand('Refilling', 'Stop');
     setRefilling(false);
   };
 
@@ -31,6 +31,12 @@ const FeedControlModal = ({ isOpen, onClose, }) => {
 
   useEffect(() => {
     fetchData();
+
+    // keep the modal current while it is open
+    return API.subscribeEvents({
+      status: (status) => setLatest(status.feed),
+      schedule: () => fetchData(),
+    });
   }, []);
 
   const instantFeed = () => {
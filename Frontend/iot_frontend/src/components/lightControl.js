@@ -49,6 +49,16 @@ const LightControlModal = ({ isOpen, onClose, }) => {
 
   useEffect(() => {
     fetchData();
+
+    // keep the modal current while it is open
+    return API.subscribeEvents({
+      status: (status) => {
+        setLightStatus(status.light);
+        setLightEnabled(status.light === 'ON');
+        setColorRgb(status.color);
+      },
+      schedule: () => fetchData(),
+    });
   }, []);
 
   /* light switch */
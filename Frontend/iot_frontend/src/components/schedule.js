@@ -26,7 +26,7 @@ const ScheduleModal = ({ isOpen, onClose }) => {
   const formatTime = (time) => time.slice(0, 5);
 
   const handleOpenConfirmModal = (schedule) => {
-    if (schedule.freq === 'Everyday') {
+    if (schedule.freq !== 'Today') {
       setSelectedSchedule(schedule);
       setIsConfirmModalVisible(true);
     } else {
@@ -37,6 +37,28 @@ export const sendTokenToServer = async (token) => {
   }
 };
 
+const toSensorData = (data) => ({
+  temp: data.temp,
+  ph: data.ph,
+  tds: data.tds,
+  waterLevel: data.waterLv,
+  eval: data.eval,
+  toNotice: data.toNotice
+});
+
+const formatFeedTime = (timestamp) => {
+  const options = {
+    year: 'numeric',
+    month: 'numeric',
+    day: 'numeric',
+    hour: '2-digit',
+    minute: '2-digit',
+    hour12: false
+  };
+
+  return new Date(timestamp * 1000).toLocaleString(undefined, options);
+};
+
 // Get sensor data
 export const fetchSensorData = async () => {
   try {
@@ -45,14 +67,7 @@ export const fetchSensorData = async () => {
         'ngrok-skip-browser-warning': '69420'
       }
     });
-    return {
-      temp: response.data.temp,
-      ph: response.data.ph,
-      tds: response.data.tds,
-      waterLevel: response.data.waterLv,
-      eval: response.data.eval,
-      toNotice: response.data.toNotice
-    };
+    return toSensorData(response.data);
   } catch (error) {
     console.error('Error fetching sensor data:', error);
     throw error;
@@ -86,16 +101,7 @@ export const fetchFeedingControlLatest = async () => {
       }
     });
 
-    const options = {
-      year: 'numeric',
-      month: 'numeric',
-      day: 'numeric',
-      hour: '2-digit',
-      minute: '2-digit',
-      hour12: false
-    };
-
-    return new Date(response.data.timestamp * 1000).toLocaleString(undefined, options);
+    return formatFeedTime(response.data.timestamp);
   } catch (error) {
     console.error('Error fetching feeding control latest:', error);
     throw error;
@@ -149,6 +155,29 @@ export const instantFeed = async () => {
   }
 };
 
+// Drainage/refilling pump, pump: Drainage or Refilling, action: Start, Stop, 30 or 100
+export const pumpControl = async (pump, action) => {
+  try {
+    const response = await axios.post(`${BASE_URL}pumpControl/`, {
+      pump,
+      action
+    }, {
+      headers: {
+        'ngrok-skip-browser-warning': '69420'
+      }
+    });
+
+    if (response.status !== 200) {
+      throw new Error('Network response was not ok');
+    }
+
+    return response.data;
+  } catch (error) {
+    console.error('Error controlling pump:', error);
+    throw error;
+  }
+};
+
 // Save user's feed schedule time
 export const scheduleFeedSave = async (payload) => {
   try {
@@ -344,7 +373,10 @@ export const savePreferences = async (payload) => {
 // Fetch data for report modal
 export const fetchReport = async () => {
   try {
+    // The report modal only charts the 7 most recent days
+    const from = new Date(Date.now() - 8 * 24 * 60 * 60 * 1000).toISOString().slice(0, 10);
     const response = await axios.get(`${BASE_URL}report/`, {
+      params: { from },
       headers: {
         'ngrok-skip-browser-warning': '69420',
       },
@@ -358,4 +390,36 @@ export const fetchReport = async () => {
     console.error('Error fetching graph data:', error);
     throw error;
   }
-}
\ No newline at end of file
+}
+
+// Live updates pushed by the server (Server-Sent Events), returns a close function.
+// handlers: { sensor(data), status({ light, color, feed }), pump({ message }), schedule(change) }
+export const subscribeEvents = (handlers) => {
+  const source = new EventSource(`${BASE_URL}events/`);
+
+  if (handlers.sensor) {
+    source.addEventListener('sensor', (event) => {
+      handlers.sensor(toSensorData(JSON.parse(event.data)));
+    });
+  }
+  if (handlers.status) {
+    source.addEventListener('status', (event) => {
+      const data = JSON.parse(event.data);
+      handlers.status({ light: data.light, color: data.color, feed: formatFeedTime(data.feed) });
+    });
+  }
+  if (handlers.pump) {
+    source.addEventListener('pump', (event) => {
+      handlers.pump(JSON.parse(event.data));
+    });
+  }
+  if (handlers.schedule) {
+    source.addEventListener('schedule', (event) => {
+      handlers.schedule(JSON.parse(event.data));
+    });
+  }
+  // EventSource reconnects by itself, the server resends the current state
+  source.onerror = () => console.error('Event stream disconnected, retrying');
+
+  return () => source.close();
+}
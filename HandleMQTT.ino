@@ -106,13 +106,26 @@ time_t feed;
 String formattedTime;
 String light;
 String color = "rgb(255, 255, 255)";
+String commandId = "";
 
 // Timer variables
-unsigned long lastSensorPublish = 0, lastDisplayRefresh = 0, lastCommandTime = 0, lastSensorRead = 0;
+unsigned long lastSensorPublish = 0, lastDisplayRefresh = 0, lastCommandTime = 0, lastSensorRead = 0, lastReconnectAttempt = 0;
 const unsigned long
   sensorReadInterval = 10000,       // 10 Sec
   sensorPublishInterval = 60000,    // 1 minutes
-  displayRefreshInterval = 120000;  // 2 minutes
+  displayRefreshInterval = 120000,  // 2 minutes
+  reconnectInterval = 5000;         // 5 Sec
+
+// Store-and-forward; readings taken while MQTT is down are kept here and
+// replayed in batches after reconnecting
+#define REPLAY_BUFFER_SIZE 120  // 2 hours of readings
+#define REPLAY_BATCH_SIZE 8     // Readings per MQTT message
+struct SensorReading {
+  time_t measuredAt;
+  float temp, ph, tds, waterLv;
+};
+SensorReading replayBuffer[REPLAY_BUFFER_SIZE];
+int replayHead = 0, replayCount = 0;
 
 void setup() {
   Serial.begin(9600);
@@ -158,6 +171,9 @@ void setup() {
     client.setServer(mqtt_server, 1883);  // Set MQTT server
     client.setCallback(mqttCallback);     // Set MQTT callback function
     client.setSocketTimeout(30);
+    client.setBufferSize(1024);           // Room for a batch of replayed readings
+
+    configTime(0, 0, "pool.ntp.org");  // Device clock for measured_at (UTC epoch)
 
     // *** TFT Update for MQTT Connection ***
     tft.fillScreen(ST77XX_BLACK);  // Clear the screen
@@ -221,6 +237,12 @@ void loop() {
   unsigned long currentMillis = millis();
   client.loop();
 
+  // Reconnect without blocking the loop, then replay buffered readings
+  if (WiFi.status() == WL_CONNECTED && !client.connected() && currentMillis - lastReconnectAttempt >= reconnectInterval) {
+    lastReconnectAttempt = currentMillis;
+    reconnectMQTT();
+  }
+
   calculateTDS();
   calculatepH();
 
@@ -303,6 +325,20 @@ void loop() {
 }
 
 
+void reconnectMQTT() {
+  String client_id = "esp32-client-";
+  client_id += String(WiFi.macAddress());
+
+  if (client.connect(client_id.c_str())) {
+    Serial.println("MQTT reconnected");
+    connectToMQTT();
+    replayReadings();
+  } else {
+    Serial.print("MQTT reconnect failed: ");
+    Serial.println(client.state());
+  }
+}
+
 void connectToMQTT() {
   client.subscribe("Freshyfishy/command");
   Serial.println("Subscribed to Freshyfishy/command");
@@ -334,6 +370,13 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
 
   // Process messages based on the topic
   if (String(topic) == "Freshyfishy/command") {
+    // Backend commands carry a "#<id>" suffix that is echoed in the response
+    commandId = "";
+    int idSeparator = message.lastIndexOf('#');
+    if (idSeparator >= 0 && message.length() - idSeparator == 9) {
+      commandId = message.substring(idSeparator + 1);
+      message = message.substring(0, idSeparator);
+    }
     processCommand(message);
   } else if (String(topic) == "Freshyfishy/tank") {
     processTankSetting(message);
@@ -358,11 +401,19 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
   }
 }
 
+// Reply on Freshyfishy/response, tagged with the id of the command being answered
+void publishResponse(String response) {
+  if (commandId.length() > 0) {
+    response += "#" + commandId;
+  }
+  client.publish("Freshyfishy/response", response.c_str());
+}
+
 // Check the command and trigger the appropriate action
 void processCommand(String command) {
   if (command == "Feed") {
     triggerFeed();
-    client.publish("Freshyfishy/response", "Feed Successful!");
+    publishResponse("Feed Successful!");
     updateDisplay();
 
   } else if (command.startsWith("ON")) {  //(e.g., "ON/(2,117,231,100)")
@@ -371,7 +422,7 @@ void processCommand(String command) {
     Serial.println("Switching Light ON with color: " + color);
     switchLight(status, color);
     // Send response to MQTT
-    client.publish("Freshyfishy/response", "Switch Successfully!");
+    publishResponse("Switch Successfully!");
     updateDisplay();
 
   } else if (command.startsWith("OFF")) {  // (e.g., "OFF")
@@ -379,7 +430,7 @@ void processCommand(String command) {
     Serial.println("Switching Light OFF");
     switchLight(status, "");
     // Send response to MQTT
-    client.publish("Freshyfishy/response", "Switch Successfully!");
+    publishResponse("Switch Successfully!");
     updateDisplay();
 
   } else if (command.startsWith("Drainage")) {
@@ -388,16 +439,20 @@ void processCommand(String command) {
 
     if (action == "Start") {
       Serial.println("Starting drainage process...");
+      publishResponse("Drainage Started");
       startDrainage(-1);
     } else if (action == "30") {
       Serial.println("Starting drainage process...");
+      publishResponse("Drainage Started");
       startDrainage(30);
     } else if (action == "100") {
       Serial.println("Starting drainage process...");
+      publishResponse("Drainage Started");
       startDrainage(100);
     } else if (action == "Stop") {
       Serial.println("Stopping drainage process...");
       stopCommandReceived = true;
+      publishResponse("Drainage Stopping");
     }
 
   } else if (command.startsWith("Refilling")) {
@@ -406,10 +461,12 @@ void processCommand(String command) {
 
     if (action == "Start") {
       Serial.println("Starting refilling process...");
+      publishResponse("Refilling Started");
       startRefilling();
     } else if (action == "Stop") {
       Serial.println("Stopping refilling process...");
       stopCommandReceived = true;
+      publishResponse("Refilling Stopping");
     }
   }
 }
@@ -491,22 +548,64 @@ void sendDataSensor() {
   // Read and calculate pH value
   calculatepH();
 
-  // Prepare JSON payload
-  StaticJsonDocument<200> doc;
-  doc["temp"] = temperature;
-  doc["ph"] = pHValue;
-  doc["tds"] = tdsValue;
-  doc["waterLv"] = filledPercentage;
+  // Queue the reading, then send everything not yet delivered
+  SensorReading reading = { time(nullptr), (float)temperature, pHValue, (float)tdsValue, (float)filledPercentage };
+  bufferReading(reading);
+  replayReadings();
+}
 
-  char buffer[256];
-  serializeJson(doc, buffer);
+void bufferReading(SensorReading reading) {
+  if (replayCount == REPLAY_BUFFER_SIZE) {
+    // Buffer full, drop the oldest reading
+    replayHead = (replayHead + 1) % REPLAY_BUFFER_SIZE;
+    replayCount--;
+  }
+  replayBuffer[(replayHead + replayCount) % REPLAY_BUFFER_SIZE] = reading;
+  replayCount++;
+}
+
+// Oldest first, as JSON arrays of up to REPLAY_BATCH_SIZE readings. The
+// backend skips readings it already has by measured_at.
+void replayReadings() {
+  while (replayCount > 0 && client.connected()) {
+    int count = min(replayCount, REPLAY_BATCH_SIZE);
+
+    // Prepare JSON payload
+    StaticJsonDocument<1024> doc;
+    JsonArray readings = doc.to<JsonArray>();
+    for (int i = 0; i < count; i++) {
+      SensorReading& reading = replayBuffer[(replayHead + i) % REPLAY_BUFFER_SIZE];
+      JsonObject item = readings.createNestedObject();
+      item["temp"] = reading.temp;
+      item["ph"] = reading.ph;
+      item["tds"] = reading.tds;
+      item["waterLv"] = reading.waterLv;
+      // Only once NTP has set the clock, otherwise the backend uses arrival time
+      if (reading.measuredAt > 1700000000) {
+        item["measured_at"] = (long)reading.measuredAt;
+      }
+    }
+
+    char buffer[1024];
+    serializeJson(doc, buffer);
 
-  // Publish to MQTT
-  client.publish("Freshyfishy/sensor", buffer);
+    // Publish to MQTT, keep the batch for the next attempt if it fails
+    if (!client.publish("Freshyfishy/sensor", buffer)) {
+      Serial.println("Sensor data publish failed, kept for replay");
+      break;
+    }
+
+    // Print sensor data to Serial Monitor
+    Serial.print("Sensor data sent to MQTT: ");
+    Serial.println(buffer);
 
-  // Print sensor data to Serial Monitor
-  Serial.print("Sensor data sent to MQTT: ");
-  Serial.println(buffer);
+    replayHead = (replayHead + count) % REPLAY_BUFFER_SIZE;
+    replayCount -= count;
+  }
+
+  if (replayCount > 0) {
+    Serial.printf("MQTT offline, %d reading(s) buffered\n", replayCount);
+  }
 }
 
 // Water Level; Ultrasonic